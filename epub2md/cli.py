@@ -6,15 +6,24 @@ Provides a git-like CLI structure for converting EPUB files to Markdown.
 
 import argparse
 import json
+import re
 import sys
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-__version__ = "0.1.0"
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional, the stdlib parser accepts bytes too
+    from json import loads as json_loads
 
-from epub2md.converter import convert_epub_to_markdown, batch_convert
+from epub2md import __version__
+from epub2md.converter import convert_epub_to_markdown, batch_convert, run_conversions
 from epub2md.utils.logging_utils import setup_logging, get_logger
 
+# Characters that are not allowed in directory names on common filesystems
+_FILENAME_UNSAFE_RE = re.compile(r'[<>:"/\\|?*]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 
 def create_parser() -> argparse.ArgumentParser:
     """Create the argument parser."""
@@ -82,6 +91,11 @@ Output Structure:
         action="store_true",
         help="With --all, also process subdirectories recursively",
     )
+    convert_parser.add_argument(
+        "--no-parallel",
+        action="store_true",
+        help="With --all, convert one file at a time instead of in parallel",
+    )
     convert_parser.add_argument(
         "--no-images",
         action="store_true",
@@ -139,6 +153,16 @@ Output Structure:
         type=str,
         help="Path to JSON configuration file",
     )
+    batch_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Reconvert every file, even if unchanged since the last batch run",
+    )
+    batch_parser.add_argument(
+        "--no-parallel",
+        action="store_true",
+        help="Convert one file at a time instead of in parallel",
+    )
     
     return parser
 
@@ -154,8 +178,8 @@ def load_config(config_path: Optional[str]) -> Dict[str, Any]:
         return {}
     
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return json_loads(path.read_bytes())
     except json.JSONDecodeError as e:
         print(f"Error parsing config file: {e}", file=sys.stderr)
         return {}
@@ -257,25 +281,27 @@ def cmd_convert_all(args: argparse.Namespace) -> int:
     if args.optimize_images:
         config.setdefault("images", {})["optimize"] = True
     
+    # Work out every output path up front: book.epub -> book/book.md
+    tasks = []
+    for epub_file in sorted(epub_files):
+        safe_name = sanitize_filename(epub_file.stem)
+        tasks.append((epub_file, epub_file.parent / safe_name / f"{safe_name}.md"))
+    
     succeeded = 0
     failed = 0
     
-    for epub_file in sorted(epub_files):
-        book_name = epub_file.stem
-        safe_name = sanitize_filename(book_name)
-        book_dir = epub_file.parent / safe_name
-        output_path = book_dir / f"{safe_name}.md"
-        
-        try:
-            result = convert_epub_to_markdown(epub_file, output_path, config)
-            print(f"✓ {epub_file.name}")
-            if result.get("title"):
-                print(f"  → {result['title']}")
-            succeeded += 1
-        except Exception as e:
-            logger.error(f"Failed to convert {epub_file}: {e}")
-            print(f"✗ {epub_file.name}: {e}", file=sys.stderr)
+    conversions = run_conversions(tasks, config, parallel=not args.no_parallel)
+    for done, ((epub_file, _), outcome) in enumerate(conversions, 1):
+        progress = f"[{done}/{len(tasks)}]"
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to convert {epub_file}: {outcome}")
+            print(f"✗ {progress} {epub_file.name}: {outcome}", file=sys.stderr)
             failed += 1
+        else:
+            print(f"✓ {progress} {epub_file.name}")
+            if outcome.get("title"):
+                print(f"  → {outcome['title']}")
+            succeeded += 1
     
     print(f"\nConversion complete: {succeeded} succeeded, {failed} failed")
     
@@ -284,18 +310,13 @@ def cmd_convert_all(args: argparse.Namespace) -> int:
 
 def sanitize_filename(name: str) -> str:
     """Sanitize a filename for use as directory name."""
-    import re
     # Remove or replace problematic characters
     # Keep alphanumeric, spaces, hyphens, underscores
-    sanitized = re.sub(r'[<>:"/\\|?*]', '', name)
+    sanitized = _FILENAME_UNSAFE_RE.sub('', name)
     # Replace multiple spaces with single space
-    sanitized = re.sub(r'\s+', ' ', sanitized)
-    # Strip leading/trailing whitespace
-    sanitized = sanitized.strip()
-    # If empty, use a default
-    if not sanitized:
-        sanitized = "output"
-    return sanitized
+    sanitized = _WHITESPACE_RE.sub(' ', sanitized)
+    # Strip leading/trailing whitespace, using a default if nothing is left
+    return sanitized.strip() or "output"
 
 
 def cmd_batch(args: argparse.Namespace) -> int:
@@ -324,12 +345,16 @@ def cmd_batch(args: argparse.Namespace) -> int:
             output_dir,
             config=config,
             recursive=args.recursive,
+            parallel=not args.no_parallel,
+            use_cache=not args.no_cache,
         )
         
         print(f"\nBatch conversion complete:")
         print(f"  Files processed: {result['files_processed']}")
         print(f"  Succeeded: {result['files_succeeded']}")
         print(f"  Failed: {result['files_failed']}")
+        if result['files_skipped'] > 0:
+            print(f"  Skipped (unchanged): {result['files_skipped']}")
         
         if result['files_failed'] > 0:
             print("\nFailed files:")
@@ -5,29 +5,56 @@ This module provides the main functions for converting EPUB files to
 clean Markdown, including the processing pipeline and batch conversion.
 """
 
+import functools
+import hashlib
+import itertools
+import json
+import logging
 import os
-import re
+import shutil
+import subprocess
 import tempfile
 import zipfile
+import zlib
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
-
-import pypandoc
-from bs4 import BeautifulSoup
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import ParseError, iterparse
 
+from epub2md import __version__
 from epub2md.processors.cleanup import clean_markdown
 from epub2md.processors.images import extract_and_process_images
-from epub2md.processors.metadata import extract_epub_metadata
-from epub2md.utils.logging_utils import get_logger
+from epub2md.processors.metadata import extract_epub_metadata, find_opf_path
+from epub2md.utils.logging_utils import get_logger, queue_logging
 
 logger = get_logger(__name__)
 
+# Batch conversion cache, stored in the output directory
+_CACHE_FILENAME = ".epub2md-cache.json"
+
+# Manifest media types of EPUB content documents that Pandoc turns into text
+_CONTENT_MEDIA_TYPES = frozenset({
+    "application/xhtml+xml",
+    "text/html",
+    "application/x-dtbook+xml",
+    "text/x-oeb1-document",
+})
+
+# Characters of the document encoded (and written) at a time
+_WRITE_CHUNK_CHARS = 1 << 20
+
+# Metadata fields written to the YAML frontmatter, in order
+_FRONTMATTER_FIELDS = ("title", "author", "publisher", "date", "language", "description")
+
+# Escapes for values inside double-quoted YAML scalars
+_YAML_ESCAPE = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": " "})
+
 
 def convert_epub_to_markdown(
     input_file: Union[str, Path],
     output_file: Union[str, Path],
     config: Optional[Dict[str, Any]] = None,
+    check_archive: bool = True,
 ) -> Dict[str, Any]:
     """
     Convert an EPUB file to clean Markdown.
@@ -36,6 +63,8 @@ def convert_epub_to_markdown(
         input_file: Path to the EPUB file to convert
         output_file: Path for the output Markdown file
         config: Configuration dictionary (optional)
+        check_archive: Run check_epub_archive first (callers that already
+            checked the file can skip it)
         
     Returns:
         Dict containing statistics about the conversion
@@ -43,119 +72,342 @@ def convert_epub_to_markdown(
     if config is None:
         config = {}
     
+    converted = _convert_text(input_file, output_file, config, check_archive=check_archive)
+    return _finish_conversion(converted, config)
+
+
+def _convert_text(
+    input_file: Union[str, Path],
+    output_file: Union[str, Path],
+    config: Dict[str, Any],
+    isolate_images: bool = False,
+    check_archive: bool = True,
+) -> Dict[str, Any]:
+    """
+    Run the first half of a conversion: metadata, Pandoc and cleanup.
+    
+    Books converted into the same output directory share its images
+    directory. With isolate_images, Pandoc extracts this book's images to a
+    private directory inside it instead, so several books can be converted
+    at once; _finish_conversion later moves them into the shared directory.
+    
+    Returns:
+        Dict with the cleaned content and everything _finish_conversion needs
+    """
+    # Read the config sections used below once
+    extract_images = config.get("processing", {}).get("extract_images", True)
+    image_config = config.get("images", {})
+    clean_config = config.get("cleanup", {})
+    
     input_path = Path(input_file)
     output_path = Path(output_file)
     
+    # String forms, computed once for Pandoc, logging and the result dict
+    input_str = os.fspath(input_path)
+    output_str = os.fspath(output_path)
+    
     # Ensure input file exists and is an .epub file
     if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+        raise FileNotFoundError(f"Input file not found: {input_str}")
     
     if input_path.suffix.lower() != ".epub":
-        raise ValueError(f"Input file must be an .epub file: {input_path}")
+        raise ValueError(f"Input file must be an .epub file: {input_str}")
+    
+    # Fail fast on broken archives before paying for a Pandoc run
+    if check_archive:
+        check_epub_archive(input_path)
     
     # Create output directory if it doesn't exist
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    logger.info(f"Converting {input_path} to {output_path}")
-    
-    stats = {}
+    logger.info(f"Converting {input_str} to {output_str}")
     
     # Step 1: Extract metadata from EPUB
     metadata = extract_epub_metadata(input_path)
-    stats["metadata"] = metadata
     
     # Step 2: Set up image extraction directory (use "images" subdirectory of output dir)
-    images_subdir = config.get("images", {}).get("extract_path", "images")
+    images_subdir = image_config.get("extract_path", "images")
     images_dir = output_path.parent / images_subdir
+    extract_dir = None
     
-    if config.get("processing", {}).get("extract_images", True):
+    if extract_images:
         images_dir.mkdir(parents=True, exist_ok=True)
+        if isolate_images:
+            extract_dir = Path(tempfile.mkdtemp(dir=images_dir, prefix=".epub2md-"))
     
     # Step 3: Use Pandoc to convert EPUB to Markdown
-    extra_args = config.get("pandoc", {}).get("extra_args", ["--wrap=none"])
+    # Always copy, so the caller's config isn't mutated below (in batch mode
+    # that used to pile up one --extract-media argument per book)
+    extra_args = list(config.get("pandoc", {}).get("extra_args", ("--wrap=none",)))
     
     # Add image extraction path (use absolute path for Pandoc)
-    if config.get("processing", {}).get("extract_images", True):
-        extra_args.append(f"--extract-media={images_dir.absolute()}")
-    
-    # Convert with Pandoc
-    markdown_content = pypandoc.convert_file(
-        str(input_path),
-        "markdown",
-        format="epub",
-        extra_args=extra_args,
-    )
-    
-    # Step 4: Clean up the markdown content
-    clean_config = config.get("cleanup", {})
-    cleaned_content, cleanup_stats = clean_markdown(
-        markdown_content,
-        remove_div_blocks=clean_config.get("remove_div_blocks", True),
-        remove_spans=clean_config.get("remove_spans", True),
-        fix_headers=clean_config.get("fix_headers", True),
-        normalize_whitespace=clean_config.get("normalize_whitespace", True),
-        fix_links=clean_config.get("fix_links", True),
-    )
-    stats.update(cleanup_stats)
+    if extract_images:
+        extra_args.append(f"--extract-media={(extract_dir or images_dir).absolute()}")
     
-    # Step 5: Process images if extracted
-    if config.get("processing", {}).get("extract_images", True) and images_dir.exists():
-        image_stats = extract_and_process_images(
-            cleaned_content,
-            images_dir,
-            optimize=config.get("images", {}).get("optimize", False),
-            max_width=config.get("images", {}).get("max_width", 1200),
+    # Convert with Pandoc, letting it write straight to a temporary file
+    # instead of returning the whole document as a Python string
+    fd, tmp_name = tempfile.mkstemp(prefix="epub2md-", suffix=".md")
+    os.close(fd)
+    tmp_md = Path(tmp_name)
+    
+    try:
+        run_pandoc(input_str, tmp_name, extra_args)
+        
+        # Step 4: Clean up the markdown content (read back from Pandoc's output)
+        cleaned_content, cleanup_stats = clean_markdown(
+            tmp_md,
+            remove_div_blocks=clean_config.get("remove_div_blocks", True),
+            remove_spans=clean_config.get("remove_spans", True),
+            fix_headers=clean_config.get("fix_headers", True),
+            normalize_whitespace=clean_config.get("normalize_whitespace", True),
+            fix_links=clean_config.get("fix_links", True),
         )
-        stats.update(image_stats)
-        # Update image paths in content
-        cleaned_content = image_stats.get("updated_content", cleaned_content)
+    except BaseException:
+        if extract_dir is not None:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+        raise
+    finally:
+        tmp_md.unlink(missing_ok=True)
     
-    # Step 6: Add frontmatter if configured
-    if config.get("frontmatter", {}).get("add", True):
-        frontmatter = generate_frontmatter(metadata, config.get("frontmatter", {}))
-        cleaned_content = frontmatter + "\n\n" + cleaned_content
+    return {
+        "input_file": input_str,
+        "output_file": output_str,
+        "metadata": metadata,
+        "content": cleaned_content,
+        "stats": cleanup_stats,
+        "images_dir": images_dir if extract_images else None,
+        "extract_dir": extract_dir,
+    }
+
+
+def _finish_conversion(converted: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the second half of a conversion: images, frontmatter and output.
     
-    # Step 7: Write final content
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(cleaned_content)
+    Args:
+        converted: Dict returned by _convert_text
+        config: Configuration dictionary
+        
+    Returns:
+        Dict containing statistics about the conversion
+    """
+    image_config = config.get("images", {})
+    frontmatter_config = config.get("frontmatter", {})
+    
+    input_str = converted["input_file"]
+    output_str = converted["output_file"]
+    metadata = converted["metadata"]
+    cleaned_content = converted["content"]
+    images_dir = converted["images_dir"]
+    extract_dir = converted["extract_dir"]
     
-    logger.info(f"Conversion completed: {input_path} -> {output_path}")
+    stats = {"metadata": metadata, **converted["stats"]}
+    
+    # Step 5: Process images if extracted
+    try:
+        if images_dir is not None and images_dir.exists():
+            image_stats = extract_and_process_images(
+                cleaned_content,
+                images_dir,
+                optimize=image_config.get("optimize", False),
+                max_width=image_config.get("max_width", 1200),
+                max_height=image_config.get("max_height", 1600),
+                convert_png_to_webp=image_config.get("convert_png_to_webp", False),
+                extract_dir=extract_dir,
+            )
+            # Update image paths in content (and keep the document itself out of
+            # the returned stats, which batch workers send back to the parent)
+            cleaned_content = image_stats.pop("updated_content", cleaned_content)
+            stats.update(image_stats)
+    finally:
+        if extract_dir is not None:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+    
+    # Step 6: Write final content, frontmatter first (if configured) then the
+    # body, without concatenating the two into yet another copy of the
+    # document; the body is encoded a slice at a time as it is written, so a
+    # full UTF-8 copy of it never exists either
+    chunks = []
+    if frontmatter_config.get("add", True):
+        frontmatter = generate_frontmatter(metadata, frontmatter_config)
+        chunks.append((frontmatter + "\n\n").encode("utf-8"))
+    write_atomic(Path(output_str), itertools.chain(chunks, _encode_chunks(cleaned_content)))
+    
+    logger.info(f"Conversion completed: {input_str} -> {output_str}")
     
     return {
-        "input_file": str(input_path),
-        "output_file": str(output_path),
+        "input_file": input_str,
+        "output_file": output_str,
         "title": metadata.get("title", ""),
         "author": metadata.get("author", ""),
         **stats,
     }
 
 
-def generate_frontmatter(metadata: Dict[str, Any], config: Dict[str, Any]) -> str:
-    """Generate YAML frontmatter from metadata."""
-    lines = ["---"]
+def check_epub_archive(epub_path: Path) -> None:
+    """
+    Cheaply check that an EPUB looks convertible.
     
-    if metadata.get("title"):
-        # Escape quotes in title
-        title = metadata["title"].replace('"', '\\"')
-        lines.append(f'title: "{title}"')
+    Only the ZIP central directory and the OPF manifest are read, so corrupt
+    or empty EPUBs are rejected in about a millisecond instead of after a
+    full Pandoc run.
     
-    if metadata.get("author"):
-        author = metadata["author"].replace('"', '\\"')
-        lines.append(f'author: "{author}"')
+    Raises:
+        ValueError: If the file is not a ZIP archive, has no OPF package
+            file, or its manifest lists no content documents
+        OSError: If the file can't be read
+    """
+    try:
+        with zipfile.ZipFile(epub_path) as epub:
+            opf_path = find_opf_path(epub)
+            if opf_path is None:
+                raise ValueError(f"Not an EPUB (missing OPF package file): {epub_path}")
+            
+            if not _manifest_has_content(epub, opf_path):
+                raise ValueError(f"EPUB has no text content: {epub_path}")
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not an EPUB (invalid ZIP archive): {epub_path}") from e
+
+
+def _manifest_has_content(epub: zipfile.ZipFile, opf_path: str) -> bool:
+    """
+    Check whether the OPF manifest lists any content documents.
     
-    if metadata.get("publisher"):
-        publisher = metadata["publisher"].replace('"', '\\"')
-        lines.append(f'publisher: "{publisher}"')
+    Content documents are recognised by media type rather than file name,
+    since EPUB 2 allows extensions such as .xml or .xht. Returns True when
+    the manifest can't be read, leaving the verdict to Pandoc.
+    """
+    try:
+        with epub.open(opf_path) as opf_file:
+            for _, elem in iterparse(opf_file):
+                tag = elem.tag.rpartition('}')[2]
+                if tag == 'item' and _media_type(elem.get('media-type')) in _CONTENT_MEDIA_TYPES:
+                    return True
+                if tag == 'manifest':
+                    return False
+    except (KeyError, ParseError, zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError):
+        return True
+    
+    return False
+
+
+def _media_type(value: Optional[str]) -> str:
+    """Normalize a media type for comparison: lowercase, parameters dropped."""
+    return (value or "").partition(";")[0].strip().lower()
+
+
+@functools.lru_cache(maxsize=None)
+def get_pandoc_path() -> str:
+    """Locate the Pandoc binary once per process and cache the result."""
+    # Imported lazily so that --help/--version don't pay for it
+    import pypandoc
     
-    if metadata.get("date"):
-        lines.append(f'date: "{metadata["date"]}"')
+    return pypandoc.get_pandoc_path()
+
+
+def run_pandoc(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    extra_args: List[str],
+) -> None:
+    """
+    Run Pandoc to convert an EPUB file to Markdown on disk.
     
-    if metadata.get("language"):
-        lines.append(f'language: "{metadata["language"]}"')
+    Pandoc is invoked directly rather than through pypandoc.convert_file,
+    which probes the binary for its supported formats (two extra Pandoc
+    processes) on every call before doing the actual conversion.
     
-    if metadata.get("description"):
-        description = metadata["description"].replace('"', '\\"').replace("\n", " ")
-        lines.append(f'description: "{description}"')
+    Args:
+        input_path: Path to the EPUB file
+        output_path: Path Pandoc should write the Markdown to
+        extra_args: Additional command-line arguments for Pandoc
+        
+    Raises:
+        RuntimeError: If Pandoc exits with a non-zero status
+    """
+    args = [
+        get_pandoc_path(),
+        "--from=epub",
+        "--to=markdown",
+        *extra_args,
+        f"--output={os.fspath(output_path)}",
+        os.fspath(input_path),
+    ]
+    proc = subprocess.run(args, capture_output=True)
+    stderr = proc.stderr.decode("utf-8", errors="replace").strip()
+    
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"Pandoc failed with exit code {proc.returncode} for {input_path}: {stderr}"
+        )
+    
+    for line in stderr.splitlines():
+        logger.warning(f"Pandoc: {line}")
+
+
+def write_atomic(output_path: Path, chunks: Iterable[bytes]) -> None:
+    """
+    Write chunks of bytes to output_path atomically.
+    
+    The data goes to a temporary file in the same directory which is then
+    renamed over output_path, so readers (and parallel batch workers) never
+    see a half-written file, even if the conversion is interrupted.
+    """
+    fd, tmp_name = _create_temp_file(output_path.parent, ".epub2md-", ".md")
+    try:
+        try:
+            for chunk in chunks:
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_name, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _create_temp_file(directory: Path, prefix: str, suffix: str) -> Tuple[int, str]:
+    """
+    Create a new, uniquely named file in directory and open it for writing.
+    
+    Unlike tempfile.mkstemp, which always uses mode 0600, the file is
+    created with mode 0666 and the process umask applied, like any other
+    new file, without having to read (and so change) the umask.
+    
+    Returns:
+        Tuple of (file descriptor, path of the file)
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    for _ in range(100):
+        name = os.path.join(directory, f"{prefix}{os.urandom(6).hex()}{suffix}")
+        try:
+            return os.open(name, flags, 0o666), name
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No usable temporary file name found in {directory}")
+
+
+def _encode_chunks(text: str, size: int = _WRITE_CHUNK_CHARS) -> Iterator[bytes]:
+    """Encode text to UTF-8 lazily, size characters at a time."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size].encode("utf-8")
+
+
+def generate_frontmatter(metadata: Dict[str, Any], config: Dict[str, Any]) -> str:
+    """Generate YAML frontmatter from metadata."""
+    lines = ["---"]
+    
+    # Escape quotes and flatten newlines in a single pass per value
+    for key in _FRONTMATTER_FIELDS:
+        value = metadata.get(key)
+        if value:
+            lines.append(f'{key}: "{value.translate(_YAML_ESCAPE)}"')
     
     # Add custom fields from config
     for key, value in config.get("custom_fields", {}).items():
@@ -171,6 +423,7 @@ def batch_convert(
     config: Optional[Dict[str, Any]] = None,
     recursive: bool = False,
     parallel: bool = True,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
     """
     Convert multiple EPUB files to Markdown.
@@ -181,6 +434,8 @@ def batch_convert(
         config: Configuration dictionary (optional)
         recursive: Whether to recursively process subdirectories
         parallel: Whether to process files in parallel
+        use_cache: Skip EPUBs whose content and config match a previous
+            successful conversion into output_dir
         
     Returns:
         Dict containing statistics about the batch conversion
@@ -199,8 +454,7 @@ def batch_convert(
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Find all .epub files
-    pattern = "**/*.epub" if recursive else "*.epub"
-    epub_files = list(input_path.glob(pattern))
+    epub_files = list(_iter_epubs(input_path, recursive))
     
     if not epub_files:
         logger.warning(f"No .epub files found in {input_path}")
@@ -208,13 +462,20 @@ def batch_convert(
             "files_processed": 0,
             "files_succeeded": 0,
             "files_failed": 0,
+            "files_skipped": 0,
             "results": [],
         }
     
     logger.info(f"Found {len(epub_files)} .epub files to process")
     
+    # Previous conversions into this output directory, keyed by output file
+    cache = _load_cache(output_path) if use_cache else {}
+    config_digest = _config_digest(config)
+    cache_updates = {}
+    
     # Prepare conversion tasks
     conversion_tasks = []
+    results = []
     for epub_file in epub_files:
         # Determine relative path from input directory
         rel_path = epub_file.relative_to(input_path)
@@ -222,34 +483,211 @@ def batch_convert(
         # Construct output file path with .md extension
         output_file = output_path / rel_path.with_suffix(".md")
         
+        # Record obviously broken or unreadable archives as failures without
+        # converting them
+        try:
+            check_epub_archive(epub_file)
+            if use_cache:
+                sha256 = _file_sha256(epub_file)
+        except Exception as e:
+            logger.error(f"Failed to convert {epub_file}: {str(e)}")
+            results.append(_failed_result(epub_file, output_file, e))
+            continue
+        
+        # Skip books that were already converted from identical input
+        if use_cache:
+            cache_key = output_file.relative_to(output_path).as_posix()
+            entry = {"sha256": sha256, "config": config_digest}
+            if _is_cached(cache.get(cache_key), entry, output_file):
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(f"Skipping unchanged {epub_file}")
+                results.append({
+                    "input_file": str(epub_file),
+                    "output_file": str(output_file),
+                    "success": True,
+                    "skipped": True,
+                })
+                continue
+            cache_updates[os.fspath(output_file)] = (cache_key, entry)
+        
         # Create parent directories if needed
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
         conversion_tasks.append((epub_file, output_file))
     
-    results = []
-    failed_count = 0
-    
-    # Process files (sequential only for now due to potential pandoc issues)
-    for input_file, output_file in conversion_tasks:
-        try:
-            result = convert_epub_to_markdown(input_file, output_file, config)
-            result["success"] = True
-            results.append(result)
-            logger.info(f"Converted {input_file} -> {output_file}")
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Failed to convert {input_file}: {str(e)}")
-            results.append({
-                "input_file": str(input_file),
-                "output_file": str(output_file),
-                "error": str(e),
-                "success": False,
-            })
+    # Every task has passed check_epub_archive above
+    conversions = run_conversions(conversion_tasks, config, parallel, check_archive=False)
+    for (input_file, output_file), outcome in conversions:
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to convert {input_file}: {str(outcome)}")
+            results.append(_failed_result(input_file, output_file, outcome))
+        else:
+            outcome["success"] = True
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Converted {input_file} -> {output_file}")
+            results.append(outcome)
+    
+    failed_count = sum(1 for r in results if not r["success"])
+    
+    # Images that couldn't be moved into place may leave outputs pointing at
+    # the wrong file, which must not then be skipped as unchanged
+    images_failed = sum(r.get("images_failed", 0) for r in results)
+    if use_cache and images_failed:
+        logger.warning(
+            f"Not updating the conversion cache: {images_failed} image(s) could not be moved"
+        )
+    elif use_cache:
+        # Remember successful conversions along with their output's mtime
+        for r in results:
+            update = cache_updates.get(r["output_file"])
+            if update and r["success"]:
+                cache_key, entry = update
+                entry["mtime_ns"] = os.stat(r["output_file"]).st_mtime_ns
+                cache[cache_key] = entry
+        _save_cache(output_path, cache)
     
     return {
-        "files_processed": len(conversion_tasks),
-        "files_succeeded": len(conversion_tasks) - failed_count,
+        "files_processed": len(epub_files),
+        "files_succeeded": len(epub_files) - failed_count,
         "files_failed": failed_count,
+        "files_skipped": sum(1 for r in results if r.get("skipped")),
         "results": results,
     }
+
+
+def run_conversions(
+    tasks: List[Tuple[Path, Path]],
+    config: Dict[str, Any],
+    parallel: bool = True,
+    check_archive: bool = True,
+) -> Iterator[Tuple[Tuple[Path, Path], Union[Dict[str, Any], Exception]]]:
+    """
+    Convert (epub, output) pairs, yielding each pair with its result or error.
+    
+    With parallel and more than one task, Pandoc and cleanup run in a
+    process pool (parallel.workers processes, default one per CPU) and
+    results are yielded as they complete. Each worker extracts its book's
+    images to a private directory, and this process moves them into the
+    shared images directory one book at a time, so books written to the
+    same output directory can't overwrite or move each other's images.
+    
+    check_archive is passed on to convert_epub_to_markdown.
+    """
+    if not parallel or len(tasks) <= 1:
+        for input_file, output_file in tasks:
+            try:
+                yield (input_file, output_file), convert_epub_to_markdown(
+                    input_file, output_file, config, check_archive
+                )
+            except Exception as e:
+                yield (input_file, output_file), e
+        return
+    
+    max_workers = config.get("parallel", {}).get("workers", os.cpu_count())
+    with queue_logging() as (initializer, initargs), ProcessPoolExecutor(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        futures = {
+            executor.submit(
+                _convert_text, input_file, output_file, config, True, check_archive
+            ): (input_file, output_file)
+            for input_file, output_file in tasks
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], _finish_conversion(future.result(), config)
+            except Exception as e:
+                yield futures[future], e
+
+
+def _load_cache(output_dir: Path) -> Dict[str, Any]:
+    """Load the batch conversion cache from output_dir, if there is one."""
+    cache_path = output_dir / _CACHE_FILENAME
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable conversion cache {cache_path}: {e}")
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_cache(output_dir: Path, cache: Dict[str, Any]) -> None:
+    """Write the batch conversion cache to output_dir."""
+    data = json.dumps(cache, indent=2, sort_keys=True).encode("utf-8")
+    write_atomic(output_dir / _CACHE_FILENAME, [data])
+
+
+def _is_cached(cached: Optional[Dict[str, Any]], entry: Dict[str, Any], output_file: Path) -> bool:
+    """Check a cache entry against the current input and its existing output."""
+    if not cached or any(cached.get(key) != value for key, value in entry.items()):
+        return False
+    try:
+        return output_file.stat().st_mtime_ns == cached.get("mtime_ns")
+    except OSError:
+        return False
+
+
+def _config_digest(config: Dict[str, Any]) -> str:
+    """
+    Hash the parts of config that affect conversion output.
+    
+    The epub2md version is included, so upgrading (which may change the
+    output) invalidates the cache.
+    """
+    relevant = {key: value for key, value in config.items() if key != "parallel"}
+    data = json.dumps([__version__, relevant], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha256(path: Path) -> str:
+    """Compute the SHA-256 hex digest of a file."""
+    with open(path, "rb") as f:
+        # Python 3.11+ hashes straight from the file descriptor in OpenSSL,
+        # which uses the CPU's SHA extensions where available
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _iter_epubs(root: Path, recursive: bool) -> Iterator[Path]:
+    """
+    Yield .epub files under root using os.scandir.
+    
+    Directory entries carry their file type from the directory listing, so
+    unlike Path.glob this needs no extra stat call per entry (except for
+    symlinks). Symlinked directories are followed, as Path.glob does; each
+    directory is visited once, so symlink loops end.
+    """
+    stack = [root]
+    seen = set()
+    while stack:
+        directory = stack.pop()
+        info = directory.stat()
+        if (info.st_dev, info.st_ino) in seen:
+            continue
+        seen.add((info.st_dev, info.st_ino))
+        
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if recursive:
+                        stack.append(Path(entry.path))
+                elif entry.name.lower().endswith(".epub") and entry.is_file():
+                    yield Path(entry.path)
+
+
+def _failed_result(input_file: Path, output_file: Path, error: Exception) -> Dict[str, Any]:
+    """Build the batch result entry for a file that failed to convert."""
+    return {
+        "input_file": str(input_file),
+        "output_file": str(output_file),
+        "error": str(error),
+        "success": False,
+    }
@@ -4,6 +4,11 @@ Processors for EPUB2MD conversion pipeline.
 
 from epub2md.processors.cleanup import clean_markdown
 from epub2md.processors.images import extract_and_process_images
-from epub2md.processors.metadata import extract_epub_metadata
+from epub2md.processors.metadata import extract_epub_metadata, extract_epub_metadata_batch
 
-__all__ = ["clean_markdown", "extract_and_process_images", "extract_epub_metadata"]
+__all__ = [
+    "clean_markdown",
+    "extract_and_process_images",
+    "extract_epub_metadata",
+    "extract_epub_metadata_batch",
+]
@@ -6,15 +6,87 @@ clean, readable Markdown without HTML artifacts.
 """
 
 import re
-from typing import Dict, Tuple, Any
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Any, Union
 
 from epub2md.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+# Line-anchored patterns (re.MULTILINE)
+_DIV_OPEN_RE = re.compile(r'^::: \{[^}]*\}\s*$', re.MULTILINE)
+_DIV_CLOSE_RE = re.compile(r'^:::\s*$', re.MULTILINE)
+
+# Spans
+_EMPTY_SPAN_RE = re.compile(r'\[\]\{[^}]*\}')
+_WHITESPACE_SPAN_RE = re.compile(r'\[\s*\]\{[^}]*\}')
+
+# Headers
+_HEADER_LINE_RE = re.compile(r'^#{1,6}\s')
+_HEADER_ATTR_RE = re.compile(r'\s*\{[^}]*\}\s*$')
+_BOLD_HEADER_RE = re.compile(r'^(#{1,6})\s+\*\*(.+?)\*\*\s*$')
+
+# Links and image paths
+_INTERNAL_LINK_RE = re.compile(r'\[([^\]]*)\]\(#[a-zA-Z0-9_]+\.html[^)]*\)')
+_EMPTY_LINK_RE = re.compile(r'\[\]\(#[^)]*\)')
+_OEBPS_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(OEBPS/images/([^)]+)\)')
+_PARENT_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(\.\./images/([^)]+)\)')
+
+# Whitespace
+_HEADER_START_RE = re.compile(r'#{1,6}(\s|$)')
+
+# Leftover artifacts removed by final_cleanup, in order: earlier rules expose
+# matches for later ones (stripping style="..." can leave {.c1 } behind).
+# Each rule has a literal that every match contains, so rules that cannot
+# match are skipped with a quick substring test; plain substrings are
+# removed with str.replace (pattern None). Rules are kept as separate
+# patterns starting with a literal, which the regex engine scans for much
+# faster than it can try an alternation at every position.
+_FINAL_CLEANUP_RULES = (
+    # Lines that are just asterisks (separators like \*\*\*\*\*)
+    ('\\*', re.compile(r'^\\\*(?:\\\*)+\s*$', re.MULTILINE), '\n---\n'),
+    # Escaped asterisks that should be horizontal rules
+    ('*', re.compile(r'^\*\s*\*\s*\*\s*\*\s*\*\s*$', re.MULTILINE), '\n---\n'),
+    # Remaining .was-a-p and .k4w-margin class references
+    ('.was-a-p', None, ''),
+    ('.k4w-margin', None, ''),
+    # Remaining style, align and vertical attributes
+    ('style="', re.compile(r'style="[^"]*"'), ''),
+    ('align="', re.compile(r'align="[^"]*"'), ''),
+    ('vertical="', re.compile(r'vertical="[^"]*"'), ''),
+    # HTML tags like <center>, </center>, <div>, etc.
+    ('center', re.compile(r'</?center[^>]*>'), ''),
+    ('div', re.compile(r'</?div[^>]*>'), ''),
+    ('span', re.compile(r'</?span[^>]*>'), ''),
+    # Pandoc attribute markers from links: {.underline}, {.filepos_src}, etc.
+    ('{', re.compile(r'\{[#.][\w\-_:]+\}'), ''),
+    ('{.', re.compile(r'\{\.[a-zA-Z_\-]+\s*\}'), ''),
+    # Image attributes: ![](path){#id} -> ![](path)
+    ('){', re.compile(r'(!\[[^\]]*\]\([^)]+\))\{[^}]*\}'), r'\1'),
+    # name="..." and id="..." attributes in remaining HTML, with the
+    # whitespace before them. (?<!\s) only lets a match start where a run
+    # of whitespace starts, as the leftmost match would anyway, instead of
+    # rescanning the rest of a long run from every position in it.
+    ('name="', re.compile(r'(?<!\s)\s*name="[^"]*"'), ''),
+    ('id="', re.compile(r'(?<!\s)\s*id="[^"]*"'), ''),
+    # Underline markers in links: [[text]{.underline}](#link) -> [text](#link)
+    ('{.underline}', re.compile(r'\[\[([^\]]+)\]\{\.underline\}\]'), r'[\1]'),
+)
+
+# Lines final_cleanup drops: whitespace and punctuation artifacts, and
+# image lines (dropped when the image was already seen). Each match starts
+# at the newline before the line; horizontal whitespace is [^\S\n] so a
+# match never runs into the next line.
+_REMOVABLE_LINE_RE = re.compile(
+    r'\n[^\S\n]*(?:'
+    r'[\-\*\_\#\{\}](?:[^\S\n]|[\-\*\_\#\{\}])*'
+    r'|!\[[^\]\n]*\]\((?P<path>[^)\n]+)\)[^\S\n]*'
+    r')(?=\n|\Z)'
+)
+
 
 def clean_markdown(
-    content: str,
+    content: Union[str, Path],
     remove_div_blocks: bool = True,
     remove_spans: bool = True,
     fix_headers: bool = True,
@@ -25,7 +97,8 @@ def clean_markdown(
     Clean up raw Pandoc Markdown output from EPUB conversion.
     
     Args:
-        content: Raw Markdown content from Pandoc
+        content: Raw Markdown content from Pandoc, or a path to a file
+            Pandoc wrote it to
         remove_div_blocks: Remove ::: div blocks
         remove_spans: Remove []{...} span artifacts
         fix_headers: Clean up header formatting
@@ -42,7 +115,10 @@ def clean_markdown(
         "links_fixed": 0,
     }
     
-    cleaned = content
+    if isinstance(content, Path):
+        cleaned = content.read_text(encoding="utf-8")
+    else:
+        cleaned = content
     
     # Step 1: Remove div blocks (::: {#...} ... :::)
     if remove_div_blocks:
@@ -88,23 +164,12 @@ def remove_div_blocks_from_content(content: str) -> Tuple[str, int]:
     content
     :::
     """
-    count = 0
-    
-    # Pattern to match div opening tags: ::: {#... .class ...}
-    div_open_pattern = re.compile(r'^::: \{[^}]*\}\s*$', re.MULTILINE)
-    
-    # Pattern to match div closing tags: :::
-    div_close_pattern = re.compile(r'^:::\s*$', re.MULTILINE)
+    # Remove div opening (::: {#... .class ...}) and closing (:::) markers,
+    # counting removals in the same pass
+    content, open_count = _DIV_OPEN_RE.subn('', content)
+    content, close_count = _DIV_CLOSE_RE.subn('', content)
     
-    # Count removals
-    count += len(div_open_pattern.findall(content))
-    count += len(div_close_pattern.findall(content))
-    
-    # Remove div markers
-    content = div_open_pattern.sub('', content)
-    content = div_close_pattern.sub('', content)
-    
-    return content, count
+    return content, open_count + close_count
 
 
 def remove_span_artifacts(content: str) -> Tuple[str, int]:
@@ -112,17 +177,12 @@ def remove_span_artifacts(content: str) -> Tuple[str, int]:
     Remove empty span artifacts like []{#id .class}.
     Also handles spans with attributes but no text.
     """
-    count = 0
-    
     # Pattern: []{#... .class ...}
-    empty_span_pattern = re.compile(r'\[\]\{[^}]*\}')
-    count = len(empty_span_pattern.findall(content))
-    content = empty_span_pattern.sub('', content)
+    content, count = _EMPTY_SPAN_RE.subn('', content)
     
     # Pattern: [ ]{#...} (spans with just whitespace)
-    whitespace_span_pattern = re.compile(r'\[\s*\]\{[^}]*\}')
-    count += len(whitespace_span_pattern.findall(content))
-    content = whitespace_span_pattern.sub('', content)
+    content, n = _WHITESPACE_SPAN_RE.subn('', content)
+    count += n
     
     return content, count
 
@@ -142,19 +202,18 @@ def fix_header_formatting(content: str) -> Tuple[str, int]:
         original = line
         
         # Check if it's a header line
-        if re.match(r'^#{1,6}\s', line):
+        if _HEADER_LINE_RE.match(line):
             # Remove attribute blocks from headers: {#id .class align="..."}
-            header_attr_pattern = re.compile(r'\s*\{[^}]*\}\s*$')
-            if header_attr_pattern.search(line):
-                line = header_attr_pattern.sub('', line)
+            if _HEADER_ATTR_RE.search(line):
+                line = _HEADER_ATTR_RE.sub('', line)
                 count += 1
             
             # Remove []{#...} spans inside headers
-            line = re.sub(r'\[\]\{[^}]*\}', '', line)
+            line = _EMPTY_SPAN_RE.sub('', line)
             
             # Clean up excessive asterisks in headers (e.g., **text** becomes text)
             # Match header and content
-            header_match = re.match(r'^(#{1,6})\s+\*\*(.+?)\*\*\s*$', line)
+            header_match = _BOLD_HEADER_RE.match(line)
             if header_match:
                 line = f"{header_match.group(1)} {header_match.group(2)}"
         
@@ -169,27 +228,20 @@ def fix_link_artifacts(content: str) -> Tuple[str, int]:
     - Remove file-based anchors like [text](#index.html_a:4)
     - Clean up image references with weird paths
     """
-    count = 0
-    
     # Pattern: links to internal HTML anchors (#index.html_xxx)
-    internal_link_pattern = re.compile(r'\[([^\]]*)\]\(#[a-zA-Z0-9_]+\.html[^)]*\)')
-    matches = internal_link_pattern.findall(content)
-    count += len(matches)
     # Keep just the text, remove the link
-    content = internal_link_pattern.sub(r'\1', content)
+    content, count = _INTERNAL_LINK_RE.subn(r'\1', content)
     
     # Pattern: empty links [](#...)
-    empty_link_pattern = re.compile(r'\[\]\(#[^)]*\)')
-    count += len(empty_link_pattern.findall(content))
-    content = empty_link_pattern.sub('', content)
+    content, n = _EMPTY_LINK_RE.subn('', content)
+    count += n
     
     # Fix image paths: ![](OEBPS/images/...) -> ![](images/...)
-    oebps_pattern = re.compile(r'!\[([^\]]*)\]\(OEBPS/images/([^)]+)\)')
-    count += len(oebps_pattern.findall(content))
-    content = oebps_pattern.sub(r'![\1](images/\2)', content)
+    content, n = _OEBPS_IMAGE_RE.subn(r'![\1](images/\2)', content)
+    count += n
     
     # Also handle other common EPUB image path patterns
-    content = re.sub(r'!\[([^\]]*)\]\(\.\./images/([^)]+)\)', r'![\1](images/\2)', content)
+    content = _PARENT_IMAGE_RE.sub(r'![\1](images/\2)', content)
     
     return content, count
 
@@ -200,99 +252,116 @@ def normalize_whitespace_content(content: str) -> str:
     - Remove excessive blank lines
     - Fix indentation issues
     - Ensure proper spacing around headers and paragraphs
+    
+    All of this happens in one pass over the lines, splitting and joining
+    the document only once.
     """
     # Replace multiple blank lines with double blank line
-    content = re.sub(r'\n{4,}', '\n\n\n', content)
-    
-    # Remove trailing whitespace from lines
-    lines = [line.rstrip() for line in content.split('\n')]
-    content = '\n'.join(lines)
-    
-    # Ensure blank line before headers
-    content = re.sub(r'([^\n])\n(#{1,6}\s)', r'\1\n\n\2', content)
+    lines = _cap_blank_runs(content.split('\n'), 2)
+    last = len(lines) - 1
+    normalized = []
+    # Whether the previous line can be followed by an inserted blank line.
+    # A bare "##" line that got one has used up its newline, as it did with
+    # the previous whole-document regex, so the line after it does not.
+    prev_is_text = False
+    
+    for i, line in enumerate(lines):
+        # Remove trailing whitespace from lines
+        line = line.rstrip()
+        
+        # Ensure blank line before headers
+        header = _HEADER_START_RE.match(line)
+        bare_header = header is not None and not header.group(1)
+        if header and prev_is_text and (i < last or not bare_header):
+            normalized.append('')
+            prev_is_text = not bare_header
+        else:
+            prev_is_text = bool(line)
+        normalized.append(line)
     
     # Remove blank lines at start of content
-    content = content.lstrip('\n')
+    start = 0
+    while start < len(normalized) and not normalized[start]:
+        start += 1
     
     # Ensure single newline at end
-    content = content.rstrip('\n') + '\n'
+    end = len(normalized)
+    while end > start and not normalized[end - 1]:
+        end -= 1
     
-    return content
+    return '\n'.join(normalized[start:end]) + '\n'
 
 
 def final_cleanup(content: str) -> str:
     """
     Final cleanup passes for remaining artifacts.
     """
-    # Remove lines that are just asterisks (separators like \*\*\*\*\*)
-    content = re.sub(r'^\\\*(\\\*)+\s*$', '\n---\n', content, flags=re.MULTILINE)
-    
-    # Clean up escaped asterisks that should be horizontal rules
-    content = re.sub(r'^\*\s*\*\s*\*\s*\*\s*\*\s*$', '\n---\n', content, flags=re.MULTILINE)
-    
-    # Remove any remaining .was-a-p class references in text
-    content = re.sub(r'\.was-a-p', '', content)
-    
-    # Remove any remaining .k4w-margin references
-    content = re.sub(r'\.k4w-margin', '', content)
-    
-    # Clean up any remaining style attributes in text
-    content = re.sub(r'style="[^"]*"', '', content)
-    
-    # Clean up any remaining align attributes
-    content = re.sub(r'align="[^"]*"', '', content)
-    
-    # Clean up any remaining vertical attributes
-    content = re.sub(r'vertical="[^"]*"', '', content)
-    
-    # Remove HTML tags like <center>, </center>, <div>, etc.
-    content = re.sub(r'</?center[^>]*>', '', content)
-    content = re.sub(r'</?div[^>]*>', '', content)
-    content = re.sub(r'</?span[^>]*>', '', content)
-    
-    # Remove Pandoc attribute markers from links: {.underline}, {.filepos_src}, etc.
-    content = re.sub(r'\{[#.][\w\-_:]+\}', '', content)
-    content = re.sub(r'\{\.[a-zA-Z_\-]+\s*\}', '', content)
-    
-    # Clean up image attributes: ![](path){#id} -> ![](path)
-    content = re.sub(r'(!\[[^\]]*\]\([^)]+\))\{[^}]*\}', r'\1', content)
-    
-    # Remove name="..." and id="..." attributes in remaining HTML
-    content = re.sub(r'\s*name="[^"]*"', '', content)
-    content = re.sub(r'\s*id="[^"]*"', '', content)
+    # Remove leftover classes, attributes, HTML tags and Pandoc markers
+    for needle, pattern, replacement in _FINAL_CLEANUP_RULES:
+        if needle in content:
+            if pattern is None:
+                content = content.replace(needle, replacement)
+            else:
+                content = pattern.sub(replacement, content)
+    
+    # Remove duplicate images (cover image often appears twice) and lines
+    # that only contain whitespace and punctuation artifacts
+    removed = _find_removable_lines(content)
+    lines = content.split('\n')
+    if removed:
+        lines = [line for i, line in enumerate(lines) if i not in removed]
     
-    # Clean up underline markers in links: [[text]{.underline}](#link) -> [text](#link)
-    content = re.sub(r'\[\[([^\]]+)\]\{\.underline\}\]', r'[\1]', content)
+    # Final whitespace normalization
+    return '\n'.join(_cap_blank_runs(lines, 1))
+
+
+def _find_removable_lines(content: str) -> Set[int]:
+    """
+    Find the numbers of artifact-only lines and repeated image lines.
     
-    # Remove duplicate images at the start (cover image often appears twice)
-    lines = content.split('\n')
+    One finditer finds both, so only those lines are handled in Python;
+    matching from the newline before each line lets the regex engine skip
+    ahead to it.
+    """
     seen_images = set()
-    cleaned_lines = []
-    for line in lines:
-        # Check if line is an image
-        img_match = re.match(r'^!\[([^\]]*)\]\(([^)]+)\)\s*$', line.strip())
-        if img_match:
-            img_path = img_match.group(2)
-            if img_path in seen_images:
-                continue  # Skip duplicate image
+    removed = set()
+    text = '\n' + content
+    line_no = 0
+    pos = 0
+    for match in _REMOVABLE_LINE_RE.finditer(text):
+        line_no += text.count('\n', pos, match.start())
+        pos = match.start()
+        img_path = match.group('path')
+        if img_path is not None and img_path not in seen_images:
             seen_images.add(img_path)
-        cleaned_lines.append(line)
-    content = '\n'.join(cleaned_lines)
-    
-    # Remove lines that only contain whitespace and punctuation artifacts
-    lines = content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Skip lines that are just artifacts
-        stripped = line.strip()
-        if stripped and not re.match(r'^[\s\-\*\_\#\{\}]+$', stripped):
-            cleaned_lines.append(line)
-        elif not stripped:
-            cleaned_lines.append(line)  # Keep blank lines
-    
-    content = '\n'.join(cleaned_lines)
+            continue
+        removed.add(line_no)
     
-    # Final whitespace normalization
-    content = re.sub(r'\n{3,}', '\n\n', content)
+    return removed
+
+
+def _cap_blank_runs(lines: List[str], max_blank: int) -> List[str]:
+    """
+    Drop empty lines beyond max_blank in a row.
     
-    return content
+    This matches collapsing runs of newlines in the joined text to
+    max_blank + 1, which leaves one more empty line at the very start and
+    end of the document, where a blank line takes one newline fewer.
+    """
+    capped = []
+    run = 0
+    limit = max_blank + 1
+    for line in lines:
+        if line:
+            run = 0
+            limit = max_blank
+        else:
+            run += 1
+            if run > limit:
+                continue
+        capped.append(line)
+    
+    if run > limit:
+        capped.append('')
+    
+    return capped
@@ -5,16 +5,41 @@ This module handles extracting, processing, and organizing images
 from EPUB files.
 """
 
+import functools
+import importlib.util
 import os
 import re
 import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Tuple, Union
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 from epub2md.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp'}
+
+# Pillow format used to save an optimized image, by extension
+_SAVE_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+    '.webp': 'WEBP',
+}
+
+# A line starting with an image, optionally followed by an attribute block,
+# capturing the rest of the line (e.g. a caption). Each match starts at the
+# newline before the line, and horizontal whitespace is [^\S\n] so a match
+# never runs into the next line.
+_IMG_LINE_RE = re.compile(
+    r'\n[^\S\n]*!\[([^\]\n]*)\]\(((?:[^()\n]|\([^)\n]*\))*)\)'
+    r'(?:\{[^}\n]*\})?([^\n]*)'
+)
+_NON_BLANK_RE = re.compile(r'\S')
+
 
 def extract_and_process_images(
     content: str,
@@ -22,6 +47,8 @@ def extract_and_process_images(
     optimize: bool = False,
     max_width: int = 1200,
     max_height: int = 1600,
+    convert_png_to_webp: bool = False,
+    extract_dir: Optional[Union[str, Path]] = None,
 ) -> Dict[str, Any]:
     """
     Process images extracted from EPUB and update content references.
@@ -32,6 +59,10 @@ def extract_and_process_images(
         optimize: Whether to optimize/resize images
         max_width: Maximum width for image optimization
         max_height: Maximum height for image optimization
+        convert_png_to_webp: Also re-encode PNGs as WebP when optimizing
+        extract_dir: Private subdirectory of images_dir this book's images
+            were extracted to, if any; only images under it are moved into
+            images_dir, so images other books left there are not touched
         
     Returns:
         Dict containing statistics and updated content
@@ -41,6 +72,7 @@ def extract_and_process_images(
         "images_found": 0,
         "images_processed": 0,
         "images_moved": 0,
+        "images_failed": 0,
         "updated_content": content,
     }
     
@@ -48,8 +80,9 @@ def extract_and_process_images(
         logger.warning(f"Images directory does not exist: {images_dir}")
         return stats
     
-    # Find all images in the directory (Pandoc may create subdirectories)
-    image_files = find_all_images(images_dir)
+    # Find all images in the directory (Pandoc may create subdirectories),
+    # walking the tree once for both the images and the directories
+    image_files, subdirs = _walk_once(Path(extract_dir) if extract_dir else images_dir)
     stats["images_found"] = len(image_files)
     
     if not image_files:
@@ -59,9 +92,17 @@ def extract_and_process_images(
         return stats
     
     # Move all images to the root of images_dir (flatten structure)
-    moved_count = flatten_images_to_root(images_dir, image_files)
+    moved_count, renamed = flatten_images_to_root(images_dir, image_files, subdirs)
     stats["images_moved"] = moved_count
     
+    # Images that were due to move but couldn't be (already logged)
+    nested_count = sum(1 for image_path in image_files if image_path.parent != images_dir)
+    stats["images_failed"] = nested_count - moved_count
+    
+    # Point references at images renamed to avoid a clash (e.g. cover_1.jpg)
+    if renamed:
+        content = rename_image_references(content, images_dir, renamed)
+    
     # Fix all image paths in content to use simple ./images/filename.jpg format
     content = fix_all_image_paths(content)
     stats["updated_content"] = content
@@ -70,46 +111,119 @@ def extract_and_process_images(
     if optimize:
         try:
             from PIL import Image
-            process_count = optimize_images(images_dir, max_width, max_height)
+            # Only this book's images: others in images_dir may belong to
+            # other books, whose references must keep pointing at them
+            own_names = _own_image_names(images_dir, image_files, renamed)
+            process_count, converted = optimize_images(
+                images_dir, max_width, max_height, convert_png_to_webp, own_names
+            )
             stats["images_processed"] = process_count
+            
+            # Point references at PNGs that were converted to WebP
+            if converted:
+                content = rename_image_references(content, images_dir, converted)
+                stats["updated_content"] = content
         except ImportError:
             logger.warning("Pillow not installed, skipping image optimization")
     
     return stats
 
 
+def _own_image_names(
+    images_dir: Path,
+    image_files: list[Path],
+    renamed: Dict[str, str],
+) -> list[str]:
+    """
+    Get the root filenames of a book's images after flattening.
+    
+    Images that failed to move are still in place and are left out.
+    """
+    names = []
+    for image_path in image_files:
+        if image_path.parent == images_dir:
+            names.append(image_path.name)
+        elif not image_path.exists():
+            rel_path = image_path.relative_to(images_dir).as_posix()
+            names.append(renamed.get(rel_path, image_path.name))
+    return names
+
+
 def find_all_images(directory: Path) -> list[Path]:
     """Find all image files in a directory and subdirectories."""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp'}
+    return _walk_once(directory)[0]
+
+
+def _walk_once(directory: Path) -> Tuple[list[Path], list[Path]]:
+    """
+    Walk a directory tree once with os.scandir.
+    
+    Returns:
+        Tuple of (image files, subdirectories ordered deepest first)
+    """
     images = []
+    subdirs = []
+    pending = [(directory, 0)]
     
-    for path in directory.rglob('*'):
-        if path.is_file() and path.suffix.lower() in image_extensions:
-            images.append(path)
+    while pending:
+        current, depth = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdir = current / entry.name
+                        subdirs.append((depth + 1, subdir))
+                        pending.append((subdir, depth + 1))
+                    elif entry.is_file():
+                        head, dot, ext = entry.name.rpartition('.')
+                        if head and f".{ext.lower()}" in _IMAGE_EXTENSIONS:
+                            images.append(current / entry.name)
+        except OSError as e:
+            logger.warning(f"Failed to read directory {current}: {e}")
     
-    return images
+    subdirs.sort(key=lambda item: item[0], reverse=True)
+    return images, [subdir for _, subdir in subdirs]
 
 
-def flatten_images_to_root(images_dir: Path, image_files: list[Path]) -> int:
+def flatten_images_to_root(
+    images_dir: Path,
+    image_files: list[Path],
+    subdirs: Optional[list[Path]] = None,
+) -> Tuple[int, Dict[str, str]]:
     """
     Move all images from subdirectories to the images_dir root.
     
     Pandoc often extracts to paths like: images/OEBPS/images/cover.jpg
     We want all images at: images/cover.jpg
+    
+    Args:
+        images_dir: Directory the images were extracted to
+        image_files: Image files found under images_dir
+        subdirs: Subdirectories of images_dir, deepest first, if already
+            known; they are looked up again otherwise
+    
+    Returns:
+        Tuple of (moved count, dict mapping the original path relative to
+        images_dir to the new filename for images renamed to avoid a clash)
     """
     moved_count = 0
+    renamed = {}
     used_names = set()
     
-    # First, collect names of images already at root level
-    for f in images_dir.iterdir():
-        if f.is_file():
-            used_names.add(f.name.lower())
+    # Skip images already at root level
+    nested = [image_path for image_path in image_files if image_path.parent != images_dir]
     
-    for image_path in image_files:
-        # Skip if already at root level
-        if image_path.parent == images_dir:
-            continue
-        
+    # First, collect names of images already at root level (only needed if
+    # anything has to move)
+    if nested:
+        with os.scandir(images_dir) as entries:
+            used_names = {
+                entry.name.lower()
+                for entry in entries
+                if entry.is_file()
+            }
+    
+    for image_path in nested:
         # Determine new filename (avoid conflicts)
         new_name = image_path.name
         base, ext = os.path.splitext(new_name)
@@ -125,14 +239,49 @@ def flatten_images_to_root(images_dir: Path, image_files: list[Path]) -> int:
         try:
             shutil.move(str(image_path), str(new_path))
             moved_count += 1
+            if new_name != image_path.name:
+                renamed[image_path.relative_to(images_dir).as_posix()] = new_name
             logger.debug(f"Moved image: {image_path.name} -> {new_path.name}")
         except Exception as e:
             logger.warning(f"Failed to move {image_path}: {e}")
     
     # Clean up empty subdirectories
-    cleanup_empty_dirs(images_dir)
+    cleanup_empty_dirs(images_dir, subdirs)
     
-    return moved_count
+    return moved_count, renamed
+
+
+def rename_image_references(
+    content: str,
+    images_dir: Path,
+    renamed: Dict[str, str],
+) -> str:
+    """
+    Rewrite references to images that were renamed while flattening.
+    
+    Pandoc references extracted images by their full path, e.g.
+    /out/images/media/file0.jpg. All renames are applied in a single pass
+    over the content using one alternation of the original paths.
+    
+    Args:
+        content: Markdown content with image references
+        images_dir: Directory the images were extracted to
+        renamed: Original path relative to images_dir -> new filename
+        
+    Returns:
+        Content with renamed images pointing at their new filename
+    """
+    replacements = {
+        f"{images_dir.name}/{old}": f"{images_dir.name}/{new}"
+        for old, new in renamed.items()
+    }
+    # Longest first, so a nested path wins over one it ends with
+    pattern = re.compile(
+        r'(?<=/)(?:'
+        + '|'.join(re.escape(old) for old in sorted(replacements, key=len, reverse=True))
+        + r')(?=[)?#])'
+    )
+    return pattern.sub(lambda m: replacements[m.group(0)], content)
 
 
 def fix_all_image_paths(content: str) -> str:
@@ -144,93 +293,93 @@ def fix_all_image_paths(content: str) -> str:
     - ![](../path/to/Book (Series)/images/cover.jpg)
     - ![](/home/user/project/images/OEBPS/images/cover.jpg)
     - ![alt](path/cover.jpg){#id}
+    - ![](path/cover.jpg) followed by a caption, which is kept
     """
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp'}
+    # Text-only content has nothing to fix
+    if '![' not in content:
+        return content
     
-    # Find all image references line by line to handle complex paths with parentheses
-    lines = content.split('\n')
-    fixed_lines = []
+    # Image lines are found with one scan of the document; the regex engine
+    # jumps between newlines and only the image lines reach Python
+    text = '\n' + content
     seen_images = set()  # Track unique images to remove duplicates
-    last_was_image = False
-    last_image_file = None
+    last_image_file = None  # Previous non-blank line's image, if it was one
+    line_no = 0
+    removed = 0
+    prev_start = prev_end = 0
     
-    for line in lines:
-        # Check for markdown image pattern at start of line (possibly with whitespace)
-        stripped = line.strip()
+    def fix_line(img_match: re.Match) -> str:
+        nonlocal last_image_file, line_no, removed, prev_start, prev_end
+        start = img_match.start()
+        line_no += text.count('\n', prev_start, start)
         
-        # Match image pattern - handle paths with parentheses by finding the last )
-        if stripped.startswith('!['):
-            # Find the ] that closes the alt text
-            bracket_end = stripped.find(']')
-            if bracket_end > 0 and len(stripped) > bracket_end + 1:
-                # Check if followed by (
-                if stripped[bracket_end + 1] == '(':
-                    # Find the path - it ends at the last ) before any { or end of line
-                    rest = stripped[bracket_end + 2:]
-                    
-                    # Find where the path ends - look for ) that's followed by { or end
-                    paren_depth = 1
-                    path_end = -1
-                    for i, c in enumerate(rest):
-                        if c == '(':
-                            paren_depth += 1
-                        elif c == ')':
-                            paren_depth -= 1
-                            if paren_depth == 0:
-                                path_end = i
-                                break
-                    
-                    if path_end > 0:
-                        full_path = rest[:path_end]
-                        alt_text = stripped[2:bracket_end]
-                        
-                        # Extract filename from path
-                        path_parts = full_path.replace('\\', '/').split('/')
-                        filename = path_parts[-1].strip()
-                        
-                        # Remove query strings or fragments
-                        if '?' in filename:
-                            filename = filename.split('?')[0]
-                        if '#' in filename:
-                            filename = filename.split('#')[0]
-                        
-                        # Check if it's an image file
-                        _, ext = os.path.splitext(filename.lower())
-                        
-                        if ext in image_extensions and filename:
-                            # Check for duplicate consecutive images
-                            if last_was_image and last_image_file == filename:
-                                # Skip duplicate
-                                continue
-                            
-                            # Skip if we've seen this exact image already at start
-                            if filename in seen_images and len(fixed_lines) < 10:
-                                continue
-                            
-                            seen_images.add(filename)
-                            fixed_lines.append(f'![{alt_text}](./images/{filename})')
-                            last_was_image = True
-                            last_image_file = filename
-                            continue
+        # Any non-blank line since the previous image breaks the run
+        if _NON_BLANK_RE.search(text, prev_end, start):
+            last_image_file = None
+        prev_start, prev_end = start, img_match.end()
+        
+        alt_text, full_path, rest = img_match.groups()
+        filename = _image_filename(full_path)
         
-        # Not an image line
-        if stripped:
-            last_was_image = False
+        if filename is None:
+            # Not an image line
             last_image_file = None
+            return img_match.group(0)
         
-        fixed_lines.append(line)
+        # Text after the image: fix the path but keep the text, and as the
+        # line is not just an image, never drop it as a duplicate
+        if rest.strip():
+            last_image_file = None
+            return f'\n![{alt_text}](./images/{filename}){rest.rstrip()}'
+        
+        # Check for duplicate consecutive images
+        if last_image_file == filename:
+            removed += 1
+            return ''
+        
+        # Skip if we've seen this exact image already at start
+        if filename in seen_images and line_no - removed < 10:
+            removed += 1
+            return ''
+        
+        seen_images.add(filename)
+        last_image_file = filename
+        return f'\n![{alt_text}](./images/{filename})'
     
-    return '\n'.join(fixed_lines)
+    return _IMG_LINE_RE.sub(fix_line, text)[1:]
 
 
-def cleanup_empty_dirs(directory: Path) -> None:
+@functools.lru_cache(maxsize=1024)
+def _image_filename(path: str) -> Optional[str]:
+    """
+    Get the filename an image path is flattened to.
+    
+    Cached, as books tend to repeat the same images (ornaments, separators)
+    many times.
+    
+    Returns:
+        The filename, or None if the path does not name an image file
+    """
+    # Extract filename from path
+    filename = path.replace('\\', '/').rpartition('/')[2].strip()
+    
+    # Remove query strings or fragments
+    filename = filename.partition('?')[0].partition('#')[0]
+    
+    # Check if it's an image file
+    _, ext = os.path.splitext(filename.lower())
+    
+    return filename if filename and ext in _IMAGE_EXTENSIONS else None
+
+
+def cleanup_empty_dirs(
+    directory: Path,
+    subdirs: Optional[list[Path]] = None,
+) -> None:
     """Remove empty subdirectories recursively."""
-    # Collect all subdirectories, deepest first
-    subdirs = sorted(
-        [d for d in directory.rglob('*') if d.is_dir()],
-        key=lambda p: len(p.parts),
-        reverse=True
-    )
+    # Collect all subdirectories, deepest first, unless the caller has them
+    if subdirs is None:
+        subdirs = _walk_once(directory)[1]
     
     for subdir in subdirs:
         try:
@@ -244,57 +393,203 @@ def optimize_images(
     images_dir: Path,
     max_width: int = 1200,
     max_height: int = 1600,
-) -> int:
+    convert_png_to_webp: bool = False,
+    names: Optional[Iterable[str]] = None,
+) -> Tuple[int, Dict[str, str]]:
     """
     Optimize images by resizing if too large.
     
-    Returns count of images processed.
+    Images are handled on a thread pool: Pillow releases the GIL while
+    decoding, resizing and encoding, so the work runs in parallel. Resized
+    PNGs with at most 256 colours are saved in palette mode, which is
+    lossless and much smaller.
+    
+    Args:
+        images_dir: Directory holding the (flattened) images
+        max_width: Maximum width for image optimization
+        max_height: Maximum height for image optimization
+        convert_png_to_webp: Re-encode every PNG as lossy WebP (quality 85)
+        names: Filenames in images_dir to optimize; defaults to every image
+            there, which is only right if images_dir holds a single book
+        
+    Returns:
+        Tuple of (count of images processed, dict mapping the old filename
+        to the new one for PNGs converted to WebP)
     """
-    try:
-        from PIL import Image
-    except ImportError:
-        return 0
+    # Pillow is optional; _optimize_one imports it on the worker threads
+    if importlib.util.find_spec('PIL') is None:
+        return 0, {}
     
-    processed = 0
+    # Only process images at root level (after flattening), so there is no
+    # need to walk the subdirectories again
+    with os.scandir(images_dir) as entries:
+        root_names = [entry.name for entry in entries if entry.is_file()]
+    if names is not None:
+        wanted = set(names)
+        candidates = [name for name in root_names if name in wanted]
+    else:
+        candidates = root_names
+    image_paths = [
+        images_dir / name
+        for name in candidates
+        if os.path.splitext(name)[1].lower() in _IMAGE_EXTENSIONS
+    ]
+    
+    if not image_paths:
+        return 0, {}
+    
+    # Pick a WebP name for each PNG up front, leaving PNGs whose name is
+    # already taken (e.g. by cover.webp) as they are
+    webp_paths = [None] * len(image_paths)
+    if convert_png_to_webp:
+        used_names = {name.lower() for name in root_names}
+        for i, image_path in enumerate(image_paths):
+            webp_name = f"{image_path.stem}.webp"
+            if image_path.suffix.lower() == '.png' and webp_name.lower() not in used_names:
+                used_names.add(webp_name.lower())
+                webp_paths[i] = images_dir / webp_name
     
-    for image_path in find_all_images(images_dir):
-        # Only process images at root level (after flattening)
-        if image_path.parent != images_dir:
+    optimize_one = functools.partial(_optimize_one, max_width=max_width, max_height=max_height)
+    workers = min(len(image_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(optimize_one, image_paths, webp_paths))
+    
+    processed = 0
+    converted = {}
+    for image_path, saved_path in zip(image_paths, results):
+        if saved_path is None:
             continue
-            
-        try:
-            with Image.open(image_path) as img:
-                # Skip if already small enough
-                if img.width <= max_width and img.height <= max_height:
-                    continue
-                
+        processed += 1
+        if saved_path != image_path:
+            converted[image_path.name] = saved_path.name
+    
+    return processed, converted
+
+
+def _optimize_one(
+    image_path: Path,
+    webp_path: Optional[Path],
+    max_width: int,
+    max_height: int,
+) -> Optional[Path]:
+    """
+    Resize a single image if it is too large, or convert it to WebP.
+    
+    Returns:
+        Path the image was saved to, or None if it was left untouched
+    """
+    from PIL import Image
+    
+    # Most images are already small enough; read just the header to find out
+    if webp_path is None:
+        size = _probe_size(image_path)
+        if size and size[0] <= max_width and size[1] <= max_height:
+            return None
+    
+    try:
+        with Image.open(image_path) as img:
+            if img.width <= max_width and img.height <= max_height:
+                # Skip if already small enough (and not being converted)
+                if webp_path is None:
+                    return None
+                resized = img
+            else:
                 # Calculate new size maintaining aspect ratio
                 ratio = min(max_width / img.width, max_height / img.height)
                 new_size = (int(img.width * ratio), int(img.height * ratio))
-                
-                # Resize and save
                 resized = img.resize(new_size, Image.Resampling.LANCZOS)
-                
-                # Determine format
-                format_map = {
-                    '.jpg': 'JPEG',
-                    '.jpeg': 'JPEG',
-                    '.png': 'PNG',
-                    '.gif': 'GIF',
-                    '.webp': 'WEBP',
-                }
-                img_format = format_map.get(image_path.suffix.lower(), 'PNG')
-                
-                # Save with optimization
-                if img_format == 'JPEG':
-                    resized.save(image_path, format=img_format, quality=85, optimize=True)
-                else:
-                    resized.save(image_path, format=img_format, optimize=True)
-                
-                processed += 1
-                logger.debug(f"Resized image: {image_path.name}")
-        
-        except Exception as e:
-            logger.warning(f"Failed to optimize {image_path}: {e}")
+            
+            if webp_path is not None:
+                resized.save(webp_path, format='WEBP', quality=85, method=4)
+                image_path.unlink()
+                logger.debug(f"Converted image: {image_path.name} -> {webp_path.name}")
+                return webp_path
+            
+            # Determine format
+            img_format = _SAVE_FORMATS.get(image_path.suffix.lower(), 'PNG')
+            
+            # Save with optimization, as an exact 8-bit palette where possible
+            if img_format == 'JPEG':
+                resized.save(image_path, format=img_format, quality=85, optimize=True)
+            else:
+                if img_format == 'PNG' and _fits_palette(resized):
+                    resized = resized.convert(
+                        'P', palette=Image.Palette.ADAPTIVE, colors=256
+                    )
+                resized.save(image_path, format=img_format, optimize=True)
+            
+            logger.debug(f"Resized image: {image_path.name}")
+            return image_path
+    
+    except Exception as e:
+        logger.warning(f"Failed to optimize {image_path}: {e}")
+        return None
+
+
+def _fits_palette(img) -> bool:
+    """Whether an RGB image has few enough colours to palettize losslessly."""
+    return img.mode == 'RGB' and img.getcolors(256) is not None
+
+
+def _probe_size(image_path: Path) -> Optional[Tuple[int, int]]:
+    """
+    Read the (width, height) of a PNG, JPEG, GIF or WebP from its header.
     
-    return processed
+    Returns None for other formats or headers that cannot be parsed, in
+    which case the caller should fall back to Pillow.
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            head = f.read(30)
+            
+            if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+            
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) == 30:
+                chunk = head[12:16]
+                if chunk == b'VP8 ':
+                    width, height = struct.unpack('<HH', head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b'VP8L':
+                    b0, b1, b2, b3 = head[21:25]
+                    width = 1 + (((b1 & 0x3F) << 8) | b0)
+                    height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | (b1 >> 6))
+                    return width, height
+                if chunk == b'VP8X':
+                    width = 1 + int.from_bytes(head[24:27], 'little')
+                    height = 1 + int.from_bytes(head[27:30], 'little')
+                    return width, height
+                return None
+            
+            if head[:2] == b'\xff\xd8':
+                return _probe_jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    
+    return None
+
+
+def _probe_jpeg_size(f) -> Optional[Tuple[int, int]]:
+    """Walk JPEG segments up to the first SOFn frame header."""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Skip fill bytes between segments
+        while marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+            if len(marker) < 2:
+                return None
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue  # Markers without a length
+        length = struct.unpack('>H', f.read(2))[0]
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
@@ -4,10 +4,17 @@ Metadata extraction processor for EPUB2MD.
 This module handles extracting metadata from EPUB files.
 """
 
+import io
+import os
+import re
+import sys
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Any, Dict, Union
-from xml.etree import ElementTree as ET
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Union
+from xml.etree.ElementTree import ParseError, fromstring, iterparse
 
 from epub2md.utils.logging_utils import get_logger
 
@@ -21,6 +28,48 @@ NAMESPACES = {
     "container": "urn:oasis:names:tc:opendocument:xmlns:container",
 }
 
+# Dublin Core elements copied straight onto EpubMetadata (last one wins)
+_SINGLE_KEY_TAGS = {
+    'title': 'title',
+    'publisher': 'publisher',
+    'date': 'date',
+    'language': 'language',
+    'description': 'description',
+    'rights': 'rights',
+}
+
+# Filename pattern used when an EPUB has no usable OPF metadata: either
+# "## - Title (Series Book #)" or "Author - Title", tried in that order
+_FILENAME_COMBINED = re.compile(
+    r'^(?:(?P<num>\d+)\s*-\s*(?P<ntitle>.+?)(?:\s*\((?P<series>[^)]+)\))?\s*$'
+    r'|(?P<author>.+?)\s*-\s*(?P<title>.+)$)'
+)
+
+
+@dataclass(slots=True)
+class EpubMetadata:
+    """Dublin Core metadata read from an OPF; None marks an element that was absent."""
+    
+    title: Optional[str] = None
+    author: Optional[str] = None
+    publisher: Optional[str] = None
+    date: Optional[str] = None
+    language: Optional[str] = None
+    description: Optional[str] = None
+    isbn: Optional[str] = None
+    identifier: Optional[str] = None
+    rights: Optional[str] = None
+    subjects: List[str] = field(default_factory=list)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the fields that were found, in the plain dict form used elsewhere."""
+        result = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is not None and value != []:
+                result[f.name] = value
+        return result
+
 
 def extract_epub_metadata(epub_path: Union[str, Path]) -> Dict[str, Any]:
     """
@@ -41,109 +90,164 @@ def extract_epub_metadata(epub_path: Union[str, Path]) -> Dict[str, Any]:
             opf_path = find_opf_path(epub)
             
             if opf_path:
-                opf_content = epub.read(opf_path).decode('utf-8')
-                metadata = parse_opf_metadata(opf_content)
+                with epub.open(opf_path) as opf_file:
+                    metadata = parse_opf_metadata_stream(opf_file).as_dict()
             else:
-                logger.warning(f"No OPF file found in {epub_path}")
+                logger.warning("No OPF file found in %s", epub_path)
                 # Try to extract basic info from filename
                 metadata = extract_metadata_from_filename(epub_path.stem)
     
     except zipfile.BadZipFile:
-        logger.error(f"Invalid EPUB file (not a valid ZIP): {epub_path}")
+        logger.error("Invalid EPUB file (not a valid ZIP): %s", epub_path)
         metadata = extract_metadata_from_filename(epub_path.stem)
     except Exception as e:
-        logger.error(f"Error extracting metadata from {epub_path}: {e}")
+        logger.exception("Error extracting metadata from %s: %s", epub_path, e)
         metadata = extract_metadata_from_filename(epub_path.stem)
     
     return metadata
 
 
+def extract_epub_metadata_batch(
+    epub_paths: Iterable[Union[str, Path]],
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Extract metadata from several EPUB files concurrently.
+    
+    Threads rather than processes: the work is zip decompression and expat
+    parsing, both of which release the GIL, and each task is tiny.
+    
+    Args:
+        epub_paths: Paths to the EPUB files
+        max_workers: Maximum number of threads (default: 4 per CPU, capped at 32)
+        
+    Returns:
+        List of metadata dicts, in the same order as epub_paths
+    """
+    epub_paths = list(epub_paths)
+    if not epub_paths:
+        return []
+    
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    workers = min(len(epub_paths), max_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract_epub_metadata, epub_paths))
+
+
 def find_opf_path(epub: zipfile.ZipFile) -> str | None:
     """Find the path to the OPF file in an EPUB archive."""
-    # First, try to find it via container.xml
+    # First, try to find it via container.xml. The raw bytes go to the XML
+    # parser, which honours the encoding declaration (UTF-16 included).
     try:
-        container_content = epub.read("META-INF/container.xml").decode('utf-8')
-        root = ET.fromstring(container_content)
+        root = fromstring(epub.read("META-INF/container.xml"))
         
-        # Look for rootfile element
-        for rootfile in root.iter():
-            if rootfile.tag.endswith('rootfile'):
+        # Look for rootfile element (namespaced per the OCF spec, bare as a fallback)
+        for rootfile_path in ('.//container:rootfile', './/rootfile'):
+            for rootfile in root.iterfind(rootfile_path, NAMESPACES):
                 opf_path = rootfile.get('full-path')
                 if opf_path:
                     return opf_path
-    except (KeyError, ET.ParseError):
+    except (KeyError, ParseError, zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError):
         pass
     
     # Fallback: look for common OPF file names
+    names = epub.namelist()
+    names_set = set(names)
     common_names = ['content.opf', 'package.opf', 'OEBPS/content.opf', 'OPS/content.opf']
     for name in common_names:
-        if name in epub.namelist():
+        if name in names_set:
             return name
     
     # Last resort: find any .opf file
-    for filename in epub.namelist():
-        if filename.endswith('.opf'):
+    for filename in names:
+        if filename.lower().endswith('.opf'):
             return filename
     
     return None
 
 
-def parse_opf_metadata(opf_content: str) -> Dict[str, Any]:
-    """Parse metadata from OPF XML content."""
-    metadata = {}
+def parse_opf_metadata(opf_content: Union[bytes, str]) -> EpubMetadata:
+    """
+    Parse metadata from OPF XML content.
     
-    try:
-        root = ET.fromstring(opf_content)
+    Args:
+        opf_content: Raw OPF XML (bytes as read from the archive, or str)
+        
+    Returns:
+        EpubMetadata with the Dublin Core metadata found in the OPF
+    """
+    if isinstance(opf_content, str):
+        opf_content = opf_content.encode('utf-8')
+    return parse_opf_metadata_stream(io.BytesIO(opf_content))
+
+
+def parse_opf_metadata_stream(fileobj: BinaryIO) -> EpubMetadata:
+    """
+    Parse metadata from an OPF XML stream.
+    
+    The OPF is parsed incrementally and reading stops as soon as the
+    <metadata> element closes, so the manifest and spine are never built
+    and the remainder of a zip member is left unread.
+    
+    Args:
+        fileobj: Binary file object positioned at the start of the OPF
         
+    Returns:
+        EpubMetadata with the Dublin Core metadata found in the OPF
+    """
+    metadata = EpubMetadata()
+    
+    try:
         # Find metadata section
         metadata_elem = None
-        for elem in root.iter():
-            if elem.tag.endswith('metadata'):
-                metadata_elem = elem
+        complete = False
+        for event, elem in iterparse(fileobj, events=("start", "end")):
+            if event == "start":
+                if metadata_elem is None and elem.tag.endswith('metadata'):
+                    metadata_elem = elem
+            elif elem is metadata_elem:
+                complete = True
                 break
+            elif metadata_elem is None:
+                # Drop anything before <metadata> as soon as it is parsed
+                elem.clear()
         
-        if metadata_elem is None:
+        if not complete:
             return metadata
         
         # Extract Dublin Core elements
         for child in metadata_elem:
-            tag = child.tag.split('}')[-1]  # Remove namespace
+            tag = child.tag.rpartition('}')[2]  # Remove namespace
             text = child.text
             
             if text:
                 text = text.strip()
                 
-                if tag == 'title':
-                    metadata['title'] = text
+                key = _SINGLE_KEY_TAGS.get(tag)
+                if key is not None:
+                    setattr(metadata, key, text)
                 elif tag == 'creator':
                     # Handle author (may have role attribute)
-                    if 'author' not in metadata:
-                        metadata['author'] = text
+                    if metadata.author is None:
+                        metadata.author = text
                     else:
-                        metadata['author'] += f", {text}"
-                elif tag == 'publisher':
-                    metadata['publisher'] = text
-                elif tag == 'date':
-                    metadata['date'] = text
-                elif tag == 'language':
-                    metadata['language'] = text
-                elif tag == 'description':
-                    metadata['description'] = text
+                        metadata.author += f", {text}"
                 elif tag == 'subject':
-                    if 'subjects' not in metadata:
-                        metadata['subjects'] = []
-                    metadata['subjects'].append(text)
+                    metadata.subjects.append(text)
                 elif tag == 'identifier':
                     # Could be ISBN or other identifier
                     if 'isbn' in text.lower() or child.get('scheme', '').lower() == 'isbn':
-                        metadata['isbn'] = text
-                    elif 'identifier' not in metadata:
-                        metadata['identifier'] = text
-                elif tag == 'rights':
-                    metadata['rights'] = text
+                        metadata.isbn = text
+                    elif metadata.identifier is None:
+                        metadata.identifier = text
+        
+        # A library only uses a handful of language codes; share one string each
+        if metadata.language is not None:
+            metadata.language = sys.intern(metadata.language)
     
-    except ET.ParseError as e:
-        logger.error(f"Error parsing OPF XML: {e}")
+    except ParseError as e:
+        logger.error("Error parsing OPF XML: %s", e)
     
     return metadata
 
@@ -159,20 +263,18 @@ def extract_metadata_from_filename(filename: str) -> Dict[str, Any]:
     """
     metadata = {}
     
-    # Try pattern: "## - Title (Series Book #)"
-    import re
-    pattern1 = re.match(r'^(\d+)\s*-\s*(.+?)(?:\s*\(([^)]+)\))?\s*$', filename)
-    if pattern1:
-        metadata['title'] = pattern1.group(2).strip()
-        if pattern1.group(3):
-            metadata['series'] = pattern1.group(3).strip()
-        return metadata
-    
-    # Try pattern: "Author - Title"
-    pattern2 = re.match(r'^(.+?)\s*-\s*(.+)$', filename)
-    if pattern2:
-        metadata['author'] = pattern2.group(1).strip()
-        metadata['title'] = pattern2.group(2).strip()
+    match = _FILENAME_COMBINED.match(filename)
+    if match:
+        # Pattern: "## - Title (Series Book #)"
+        if match.group('num') is not None:
+            metadata['title'] = match.group('ntitle').strip()
+            if match.group('series'):
+                metadata['series'] = match.group('series').strip()
+            return metadata
+        
+        # Pattern: "Author - Title"
+        metadata['author'] = match.group('author').strip()
+        metadata['title'] = match.group('title').strip()
         return metadata
     
     # Fallback: use filename as title
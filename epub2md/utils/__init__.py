@@ -2,6 +2,11 @@
 Utility modules for EPUB2MD.
 """
 
-from epub2md.utils.logging_utils import get_logger, setup_logging
+from epub2md.utils.logging_utils import (
+    get_logger,
+    queue_logging,
+    setup_logging,
+    setup_worker_logging,
+)
 
-__all__ = ["get_logger", "setup_logging"]
+__all__ = ["get_logger", "queue_logging", "setup_logging", "setup_worker_logging"]
@@ -3,8 +3,11 @@ Logging utilities for EPUB2MD.
 """
 
 import logging
+import multiprocessing
 import sys
-from typing import Optional
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Iterator, Optional, Tuple
 
 
 def setup_logging(
@@ -25,30 +28,27 @@ def setup_logging(
     
     # Convert level string to logging constant
     numeric_level = getattr(logging, level.upper(), logging.INFO)
+    formatter = logging.Formatter(log_format)
     
-    # Configure root logger
-    handlers = []
+    # Drop (and close) whatever a previous call installed on the root logger
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(numeric_level)
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(numeric_level)
-    console_handler.setFormatter(logging.Formatter(log_format))
-    handlers.append(console_handler)
+    console_handler.setFormatter(formatter)
+    root.addHandler(console_handler)
     
     # File handler if specified
     if log_file:
         file_handler = logging.FileHandler(log_file)
         file_handler.setLevel(numeric_level)
-        file_handler.setFormatter(logging.Formatter(log_format))
-        handlers.append(file_handler)
-    
-    # Configure root logger
-    logging.basicConfig(
-        level=numeric_level,
-        format=log_format,
-        handlers=handlers,
-        force=True,
-    )
+        file_handler.setFormatter(formatter)
+        root.addHandler(file_handler)
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -62,3 +62,47 @@ def get_logger(name: str) -> logging.Logger:
         Logger instance
     """
     return logging.getLogger(name)
+
+
+@contextmanager
+def queue_logging() -> Iterator[Tuple[Optional[Callable[..., None]], Tuple[Any, ...]]]:
+    """
+    Route log records from worker processes through this process's handlers.
+    
+    Yields an (initializer, initargs) pair for ProcessPoolExecutor. Workers
+    set up with it push their records onto a queue, and a single listener
+    thread here writes them out, so worker output is serialized instead of
+    every process writing to the console and log file on its own.
+    
+    If the root logger has no handlers configured, nothing is redirected
+    and (None, ()) is yielded.
+    """
+    root = logging.getLogger()
+    if not root.handlers:
+        yield None, ()
+        return
+    
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        yield setup_worker_logging, (log_queue, root.level)
+    finally:
+        listener.stop()
+        log_queue.close()
+        log_queue.join_thread()
+
+
+def setup_worker_logging(log_queue: Any, level: int) -> None:
+    """
+    Send all logging in a worker process to log_queue.
+    
+    Args:
+        log_queue: Queue read by the parent process's QueueListener
+        level: Logging level for the worker's root logger
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
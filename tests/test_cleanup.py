@@ -7,6 +7,8 @@ from epub2md.processors.cleanup import (
     remove_span_artifacts,
     fix_header_formatting,
     fix_link_artifacts,
+    final_cleanup,
+    normalize_whitespace_content,
 )
 
 
@@ -79,6 +81,35 @@ class TestFixLinkArtifacts:
         assert "](images/cover.jpg)" in result
 
 
+class TestFinalCleanup:
+    """Tests for the final artifact passes."""
+
+    def test_removes_leftover_classes_and_tags(self):
+        content = '<center>Chapter One</center>.was-a-p'
+        assert final_cleanup(content) == "Chapter One"
+
+    def test_strips_attributes_exposed_by_earlier_rules(self):
+        content = 'Text {.c style="x"} and <span id="a">more</span>'
+        assert final_cleanup(content) == "Text  and more"
+
+    def test_strips_html_attributes_with_leading_whitespace(self):
+        content = 'a' + ' ' * 5000 + 'name="n" b \n\n id="i"'
+        assert final_cleanup(content) == "a b"
+
+    def test_strips_image_attributes(self):
+        content = '![](images/a.jpg){#i}{width="50%"}'
+        assert final_cleanup(content) == "![](images/a.jpg)"
+
+
+class TestNormalizeWhitespace:
+    """Tests for whitespace normalization."""
+
+    def test_caps_blank_lines_and_spaces_headers(self):
+        content = "\n\nIntro   \n\n\n\n\nText\n## Section\n\n\n"
+        result = normalize_whitespace_content(content)
+        assert result == "Intro\n\n\nText\n\n## Section\n"
+
+
 class TestCleanMarkdown:
     """Integration tests for the full cleanup pipeline."""
 
@@ -97,3 +128,11 @@ class TestCleanMarkdown:
         assert "{#" not in result
         assert "Some paragraph text" in result
         assert stats["divs_removed"] > 0
+
+    def test_accepts_path(self, tmp_path):
+        source = tmp_path / "raw.md"
+        source.write_text("::: {#wrapper}\n# Title {#title}\n:::\n", encoding="utf-8")
+        result, stats = clean_markdown(source)
+
+        assert result == "# Title\n"
+        assert stats["divs_removed"] == 2
@@ -0,0 +1,39 @@
+"""Tests for the command-line helpers."""
+
+import pytest
+from epub2md.cli import create_parser, sanitize_filename
+
+
+class TestSanitizeFilename:
+    """Tests for output directory name sanitizing."""
+
+    def test_removes_unsafe_characters(self):
+        assert sanitize_filename('a<b>:c"d/e\\f|g?h*i') == "abcdefghi"
+
+    def test_collapses_whitespace(self):
+        assert sanitize_filename("  The   God\tGame  ") == "The God Game"
+
+    def test_keeps_series_names(self):
+        name = "01 - The God Game (The God Series Book 1)"
+        assert sanitize_filename(name) == name
+
+    def test_empty_falls_back_to_default(self):
+        assert sanitize_filename(" ?* ") == "output"
+
+
+class TestParser:
+    """Tests for command-line parsing."""
+
+    @pytest.mark.parametrize("argv", [
+        ["convert", "--all"],
+        ["batch", "epubs", "out"],
+    ])
+    def test_parallel_by_default(self, argv):
+        assert create_parser().parse_args(argv).no_parallel is False
+
+    @pytest.mark.parametrize("argv", [
+        ["convert", "--all", "--no-parallel"],
+        ["batch", "epubs", "out", "--no-parallel"],
+    ])
+    def test_no_parallel(self, argv):
+        assert create_parser().parse_args(argv).no_parallel is True
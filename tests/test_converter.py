@@ -0,0 +1,379 @@
+"""Tests for the conversion helpers."""
+
+import os
+import re
+import stat
+import struct
+import zipfile
+import zlib
+from pathlib import Path
+
+import pytest
+from epub2md import converter
+from epub2md.converter import (
+    batch_convert,
+    check_epub_archive,
+    convert_epub_to_markdown,
+    generate_frontmatter,
+    write_atomic,
+)
+
+
+def make_epub(path, names=("content.opf", "chapter1.xhtml")):
+    """Write a minimal EPUB-shaped ZIP archive containing the given entries."""
+    with zipfile.ZipFile(path, "w") as epub:
+        epub.writestr("mimetype", "application/epub+zip")
+        for name in names:
+            epub.writestr(name, "")
+    return path
+
+
+def make_manifest_epub(path, items):
+    """Write an EPUB whose OPF manifest lists the given href -> media-type items."""
+    manifest = "".join(
+        f'<item id="i{n}" href="{href}" media-type="{media_type}"/>'
+        for n, (href, media_type) in enumerate(items.items())
+    )
+    opf = (
+        '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="2.0">'
+        f"<metadata/><manifest>{manifest}</manifest><spine/></package>"
+    )
+    with zipfile.ZipFile(path, "w") as epub:
+        epub.writestr("mimetype", "application/epub+zip")
+        epub.writestr("OEBPS/content.opf", opf)
+        for href in items:
+            epub.writestr(f"OEBPS/{href}", "")
+    return path
+
+
+def make_png(rgb):
+    """Build a tiny solid-colour 2x2 PNG."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    raw = (b"\x00" + bytes(rgb) * 2) * 2
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 2, 2, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_illustrated_epub(path, book, pictures=2):
+    """Write a real EPUB whose images share names with other books' images."""
+    items = "".join(
+        f'<item id="p{i}" href="images/pic{i}.png" media-type="image/png"/>'
+        for i in range(pictures)
+    )
+    body = "".join(
+        f'<p><img src="images/pic{i}.png" alt="{book}-{i}"/></p>' for i in range(pictures)
+    )
+    with zipfile.ZipFile(path, "w") as epub:
+        epub.writestr("mimetype", "application/epub+zip")
+        epub.writestr(
+            "META-INF/container.xml",
+            '<?xml version="1.0"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>",
+        )
+        epub.writestr(
+            "OEBPS/content.opf",
+            '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="2.0" '
+            'unique-identifier="id"><metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:title>Book {book}</dc:title><dc:identifier id="id">{book}</dc:identifier>'
+            '</metadata><manifest><item id="ch" href="ch.xhtml" media-type="application/xhtml+xml"/>'
+            f'{items}</manifest><spine><itemref idref="ch"/></spine></package>',
+        )
+        epub.writestr(
+            "OEBPS/ch.xhtml",
+            '<?xml version="1.0"?><html xmlns="http://www.w3.org/1999/xhtml"><head><title>t</title>'
+            f"</head><body><h1>Book {book}</h1>{body}</body></html>",
+        )
+        for i in range(pictures):
+            epub.writestr(f"OEBPS/images/pic{i}.png", make_png((book * 30, i * 60, 7)))
+    return path
+
+
+def have_pandoc():
+    try:
+        converter.get_pandoc_path()
+    except Exception:
+        return False
+    return True
+
+
+class TestGenerateFrontmatter:
+    """Tests for YAML frontmatter generation."""
+
+    def test_fields_in_order(self):
+        metadata = {"language": "en", "title": "Book", "author": "Jane Doe"}
+        result = generate_frontmatter(metadata, {})
+        assert result == '---\ntitle: "Book"\nauthor: "Jane Doe"\nlanguage: "en"\n---'
+
+    def test_skips_missing_and_empty_fields(self):
+        result = generate_frontmatter({"title": "Book", "publisher": ""}, {})
+        assert "publisher" not in result
+
+    def test_escapes_quotes_and_newlines(self):
+        metadata = {
+            "title": 'The "Test" Book',
+            "description": 'A "quoted"\ndescription',
+        }
+        result = generate_frontmatter(metadata, {})
+        assert 'title: "The \\"Test\\" Book"' in result
+        assert 'description: "A \\"quoted\\" description"' in result
+
+    def test_escapes_backslashes(self):
+        result = generate_frontmatter({"title": "C:\\Books"}, {})
+        assert 'title: "C:\\\\Books"' in result
+
+    def test_custom_fields(self):
+        result = generate_frontmatter({}, {"custom_fields": {"format": "book"}})
+        assert result == '---\nformat: "book"\n---'
+
+
+class TestWriteAtomic:
+    """Tests for atomic output writing."""
+
+    def test_writes_chunks_in_order(self, tmp_path):
+        output = tmp_path / "book.md"
+        write_atomic(output, [b"---\n---\n\n", "Caf\u00e9\n".encode("utf-8")])
+        assert output.read_text(encoding="utf-8") == "---\n---\n\nCaf\u00e9\n"
+
+    def test_writes_lazily_encoded_chunks(self, tmp_path):
+        output = tmp_path / "book.md"
+        text = "Caf\u00e9 \u2014 \U0001F4D6\n" * 10
+        write_atomic(output, converter._encode_chunks(text, size=7))
+        assert output.read_text(encoding="utf-8") == text
+
+    def test_replaces_existing_file_without_leftovers(self, tmp_path):
+        output = tmp_path / "book.md"
+        output.write_text("old", encoding="utf-8")
+        write_atomic(output, [b"new"])
+        assert output.read_bytes() == b"new"
+        assert [p.name for p in tmp_path.iterdir()] == ["book.md"]
+
+    @pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+    def test_new_file_gets_umask_permissions(self, tmp_path):
+        old_umask = os.umask(0o027)
+        try:
+            write_atomic(tmp_path / "book.md", [b"text"])
+        finally:
+            os.umask(old_umask)
+        assert stat.S_IMODE((tmp_path / "book.md").stat().st_mode) == 0o640
+
+    def test_failed_replace_leaves_no_temp_file(self, tmp_path, monkeypatch):
+        def fail_replace(src, dst):
+            raise OSError("read-only")
+
+        monkeypatch.setattr(converter.os, "replace", fail_replace)
+        with pytest.raises(OSError, match="read-only"):
+            write_atomic(tmp_path / "book.md", [b"text"])
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestCheckEpubArchive:
+    """Tests for the pre-Pandoc EPUB sanity check."""
+
+    def test_accepts_epub(self, tmp_path):
+        check_epub_archive(make_epub(tmp_path / "book.epub"))
+
+    def test_rejects_non_zip(self, tmp_path):
+        epub = tmp_path / "book.epub"
+        epub.write_bytes(b"not a zip")
+        with pytest.raises(ValueError, match="invalid ZIP"):
+            check_epub_archive(epub)
+
+    def test_rejects_missing_opf(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", names=("chapter1.xhtml",))
+        with pytest.raises(ValueError, match="missing OPF"):
+            check_epub_archive(epub)
+
+    def test_rejects_manifest_without_content(self, tmp_path):
+        epub = make_manifest_epub(tmp_path / "book.epub", {"cover.jpg": "image/jpeg"})
+        with pytest.raises(ValueError, match="no text content"):
+            check_epub_archive(epub)
+
+    def test_accepts_content_documents_with_any_extension(self, tmp_path):
+        epub = make_manifest_epub(tmp_path / "book.epub", {
+            "cover.jpg": "image/jpeg",
+            "chapter1.xml": "application/xhtml+xml",
+        })
+        check_epub_archive(epub)
+
+    def test_accepts_media_type_parameters_and_case(self, tmp_path):
+        epub = make_manifest_epub(tmp_path / "book.epub", {
+            "chapter1.xhtml": "Application/XHTML+XML; charset=utf-8",
+        })
+        check_epub_archive(epub)
+
+    def test_finds_opf_through_utf16_container(self, tmp_path):
+        epub = tmp_path / "book.epub"
+        container = (
+            '<?xml version="1.0" encoding="UTF-16"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/package.xml"/></rootfiles></container>'
+        )
+        with zipfile.ZipFile(epub, "w") as archive:
+            archive.writestr("META-INF/container.xml", container.encode("utf-16"))
+            archive.writestr("OEBPS/package.xml", "")
+        check_epub_archive(epub)
+
+
+@pytest.fixture
+def pandoc_calls(monkeypatch):
+    """Replace Pandoc with a stub that records its arguments."""
+    calls = []
+
+    def fake_run_pandoc(input_path, output_path, extra_args):
+        calls.append(list(extra_args))
+        Path(output_path).write_text("# Title\n\nText.\n", encoding="utf-8")
+
+    monkeypatch.setattr(converter, "run_pandoc", fake_run_pandoc)
+    return calls
+
+
+class TestConvertEpubToMarkdown:
+    """Tests for the single-file pipeline, with Pandoc stubbed out."""
+
+    def test_does_not_mutate_config(self, tmp_path, pandoc_calls):
+        epub = make_epub(tmp_path / "book.epub")
+        config = {"pandoc": {"extra_args": ["--wrap=none"]}}
+
+        convert_epub_to_markdown(epub, tmp_path / "a" / "a.md", config)
+        convert_epub_to_markdown(epub, tmp_path / "b" / "b.md", config)
+
+        assert config["pandoc"]["extra_args"] == ["--wrap=none"]
+        assert [len(args) for args in pandoc_calls] == [2, 2]
+
+
+class TestBatchConvert:
+    """Tests for batch conversion, with Pandoc stubbed out."""
+
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        input_dir = tmp_path / "epubs"
+        input_dir.mkdir()
+        make_epub(input_dir / "one.epub")
+        make_epub(input_dir / "two.epub")
+        (input_dir / "broken.epub").write_bytes(b"")
+        return input_dir
+
+    def test_records_failures_without_aborting(self, tmp_path, input_dir, pandoc_calls):
+        result = batch_convert(input_dir, tmp_path / "out", parallel=False)
+
+        assert result["files_processed"] == 3
+        assert result["files_succeeded"] == 2
+        assert result["files_failed"] == 1
+        assert (tmp_path / "out" / "one.md").exists()
+
+    def test_records_unreadable_files_without_aborting(self, tmp_path, input_dir, pandoc_calls, monkeypatch):
+        check = converter.check_epub_archive
+
+        def unreadable(path):
+            if path.name == "one.epub":
+                raise PermissionError(f"Permission denied: {path}")
+            check(path)
+
+        monkeypatch.setattr(converter, "check_epub_archive", unreadable)
+        result = batch_convert(input_dir, tmp_path / "out", parallel=False)
+
+        assert result["files_failed"] == 2
+        assert result["files_succeeded"] == 1
+
+    def test_skips_unchanged_files(self, tmp_path, input_dir, pandoc_calls):
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        result = batch_convert(input_dir, tmp_path / "out", parallel=False)
+
+        assert len(pandoc_calls) == 2
+        assert result["files_skipped"] == 2
+        assert result["files_succeeded"] == 2
+
+    def test_reconverts_when_config_or_input_changes(self, tmp_path, input_dir, pandoc_calls):
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        make_epub(input_dir / "one.epub", names=("content.opf", "chapter1.xhtml", "c2.xhtml"))
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        assert len(pandoc_calls) == 3
+
+        batch_convert(input_dir, tmp_path / "out", {"frontmatter": {"add": False}}, parallel=False)
+        assert len(pandoc_calls) == 5
+
+    def test_reconverts_after_upgrade(self, tmp_path, input_dir, pandoc_calls, monkeypatch):
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        monkeypatch.setattr(converter, "__version__", "999.0")
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        assert len(pandoc_calls) == 4
+
+    def test_records_files_that_fail_to_hash(self, tmp_path, input_dir, pandoc_calls, monkeypatch):
+        def unreadable(path):
+            raise OSError(f"Input/output error: {path}")
+
+        monkeypatch.setattr(converter, "_file_sha256", unreadable)
+        result = batch_convert(input_dir, tmp_path / "out", parallel=False)
+
+        assert result["files_failed"] == 3
+        assert pandoc_calls == []
+
+    def test_image_move_failures_are_not_cached(self, tmp_path, input_dir, pandoc_calls, monkeypatch):
+        def failed_images(content, images_dir, **kwargs):
+            return {"updated_content": content, "images_failed": 1}
+
+        monkeypatch.setattr(converter, "extract_and_process_images", failed_images)
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        assert len(pandoc_calls) == 4
+
+    def test_checks_each_archive_once(self, tmp_path, input_dir, pandoc_calls, monkeypatch):
+        checked = []
+        check = converter.check_epub_archive
+        monkeypatch.setattr(converter, "check_epub_archive", lambda path: checked.append(path) or check(path))
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        assert len(checked) == 3
+
+    @pytest.mark.skipif(os.name == "nt", reason="symlinks need privileges on Windows")
+    def test_recursive_follows_directory_symlinks(self, tmp_path, input_dir, pandoc_calls):
+        shelf = tmp_path / "shelf"
+        shelf.mkdir()
+        make_epub(shelf / "three.epub")
+        (shelf / "loop").symlink_to(shelf)
+        (input_dir / "linked").symlink_to(shelf)
+        (input_dir / "dangling.epub").symlink_to(tmp_path / "missing.epub")
+        (input_dir / "folder.epub").mkdir()
+
+        result = batch_convert(input_dir, tmp_path / "out", recursive=True, parallel=False)
+
+        assert result["files_processed"] == 4
+        assert (tmp_path / "out" / "linked" / "three.md").exists()
+
+    def test_no_cache_reconverts(self, tmp_path, input_dir, pandoc_calls):
+        batch_convert(input_dir, tmp_path / "out", parallel=False)
+        batch_convert(input_dir, tmp_path / "out", parallel=False, use_cache=False)
+        assert len(pandoc_calls) == 4
+
+
+@pytest.mark.skipif(not have_pandoc(), reason="Pandoc is not available")
+class TestParallelBatchConvert:
+    """Tests for the process pool path, with real Pandoc."""
+
+    def test_books_sharing_an_images_dir_keep_their_own_images(self, tmp_path):
+        input_dir = tmp_path / "epubs"
+        input_dir.mkdir()
+        books = range(6)
+        for book in books:
+            make_illustrated_epub(input_dir / f"book{book}.epub", book)
+        output_dir = tmp_path / "out"
+
+        result = batch_convert(input_dir, output_dir, {"parallel": {"workers": 4}})
+
+        assert result["files_succeeded"] == len(books)
+        for book in books:
+            content = (output_dir / f"book{book}.md").read_text(encoding="utf-8")
+            refs = re.findall(r"!\[(\d+)-(\d+)\]\(([^)]+)\)", content)
+            assert len(refs) == 2
+            for alt_book, picture, ref in refs:
+                assert (output_dir / ref).read_bytes() == make_png((book * 30, int(picture) * 60, 7))
+        images = sorted(p.name for p in (output_dir / "images").iterdir())
+        assert len(images) == 2 * len(books)
+        assert not any(name.startswith(".") for name in images)
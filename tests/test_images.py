@@ -0,0 +1,208 @@
+"""Tests for the image processor."""
+
+import pytest
+from epub2md.processors import images
+from epub2md.processors.images import (
+    _probe_size,
+    extract_and_process_images,
+    find_all_images,
+    fix_all_image_paths,
+    flatten_images_to_root,
+    optimize_images,
+    rename_image_references,
+)
+
+
+def make_image(path, data=b"img"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+class TestFindAllImages:
+    """Tests for locating extracted images."""
+
+    def test_finds_nested_images_only(self, tmp_path):
+        cover = make_image(tmp_path / "OEBPS" / "images" / "cover.JPG")
+        figure = make_image(tmp_path / "figure.png")
+        make_image(tmp_path / "OEBPS" / "styles.css")
+        make_image(tmp_path / "jpg")
+
+        assert sorted(find_all_images(tmp_path)) == sorted([cover, figure])
+
+
+class TestFlattenImagesToRoot:
+    """Tests for moving images to the images root."""
+
+    def test_moves_nested_images(self, tmp_path):
+        image = make_image(tmp_path / "media" / "cover.jpg")
+        moved, renamed = flatten_images_to_root(tmp_path, [image])
+
+        assert moved == 1
+        assert renamed == {}
+        assert (tmp_path / "cover.jpg").exists()
+        assert not (tmp_path / "media").exists()
+
+    def test_reports_renamed_images(self, tmp_path):
+        make_image(tmp_path / "cover.jpg", b"old")
+        image = make_image(tmp_path / "media" / "cover.jpg", b"new")
+        moved, renamed = flatten_images_to_root(tmp_path, [image])
+
+        assert moved == 1
+        assert renamed == {"media/cover.jpg": "cover_1.jpg"}
+        assert (tmp_path / "cover_1.jpg").read_bytes() == b"new"
+
+
+class TestRenameImageReferences:
+    """Tests for rewriting references to renamed images."""
+
+    def test_rewrites_only_renamed_paths(self, tmp_path):
+        images_dir = tmp_path / "images"
+        content = (
+            f"![]({images_dir}/media/cover.jpg)\n"
+            f"![]({images_dir}/media/other.jpg)\n"
+            f"See ![x]({images_dir}/media/cover.jpg) inline"
+        )
+        result = rename_image_references(
+            content, images_dir, {"media/cover.jpg": "cover_1.jpg"}
+        )
+
+        assert result == (
+            f"![]({images_dir}/cover_1.jpg)\n"
+            f"![]({images_dir}/media/other.jpg)\n"
+            f"See ![x]({images_dir}/cover_1.jpg) inline"
+        )
+
+
+class TestExtractAndProcessImages:
+    """Integration tests for image extraction."""
+
+    def test_colliding_image_keeps_its_reference(self, tmp_path):
+        images_dir = tmp_path / "images"
+        make_image(images_dir / "file0.jpg", b"first book")
+        make_image(images_dir / "media" / "file0.jpg", b"second book")
+        content = f"![]({images_dir}/media/file0.jpg)"
+
+        stats = extract_and_process_images(content, images_dir)
+
+        assert stats["updated_content"] == "![](./images/file0_1.jpg)"
+        assert (images_dir / "file0_1.jpg").read_bytes() == b"second book"
+
+    def test_counts_images_that_failed_to_move(self, tmp_path, monkeypatch):
+        def fail_move(src, dst):
+            raise OSError("disk full")
+
+        images_dir = tmp_path / "images"
+        make_image(images_dir / "media" / "file0.jpg")
+        monkeypatch.setattr(images.shutil, "move", fail_move)
+
+        stats = extract_and_process_images(f"![]({images_dir}/media/file0.jpg)", images_dir)
+
+        assert stats["images_moved"] == 0
+        assert stats["images_failed"] == 1
+
+
+class TestFixAllImagePaths:
+    """Tests for image path normalization."""
+
+    def test_handles_parentheses_in_path(self):
+        content = "![](../Book (Series)/images/OEBPS/images/cover.jpg){#id}"
+        assert fix_all_image_paths(content) == "![](./images/cover.jpg)"
+
+    def test_keeps_text_after_image(self):
+        content = "![](/abs/out/images/.epub2md-xyz/OEBPS/img.png) caption"
+        assert fix_all_image_paths(content) == "![](./images/img.png) caption"
+
+    def test_never_drops_image_lines_with_text_as_duplicates(self):
+        content = "![](a.png)\n![](a.png){#id} caption"
+        assert fix_all_image_paths(content) == "![](./images/a.png)\n![](./images/a.png) caption"
+
+
+class TestOptimizeImages:
+    """Tests for resizing oversized images."""
+
+    def test_resizes_only_large_images(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (400, 200)).save(tmp_path / "large.jpg")
+        Image.new("RGB", (50, 50)).save(tmp_path / "small.png")
+
+        assert optimize_images(tmp_path, max_width=100, max_height=100) == (1, {})
+        with Image.open(tmp_path / "large.jpg") as img:
+            assert img.size == (100, 50)
+        with Image.open(tmp_path / "small.png") as img:
+            assert img.size == (50, 50)
+
+    def test_palettizes_flat_pngs(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (400, 400), (10, 20, 30)).save(tmp_path / "diagram.png")
+
+        optimize_images(tmp_path, max_width=100, max_height=100)
+        with Image.open(tmp_path / "diagram.png") as img:
+            assert img.mode == "P"
+            assert img.convert("RGB").getpixel((0, 0)) == (10, 20, 30)
+
+    def test_converts_pngs_to_webp(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (50, 50)).save(tmp_path / "a.png")
+        Image.new("RGB", (50, 50)).save(tmp_path / "b.png")
+        Image.new("RGB", (50, 50)).save(tmp_path / "b.webp")
+
+        processed, converted = optimize_images(tmp_path, convert_png_to_webp=True)
+
+        assert (processed, converted) == (1, {"a.png": "a.webp"})
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a.webp", "b.png", "b.webp"]
+
+    def test_extract_updates_references_to_webp(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        images_dir = tmp_path / "images"
+        images_dir.mkdir()
+        Image.new("RGB", (50, 50)).save(images_dir / "a.png")
+
+        stats = extract_and_process_images(
+            f"![]({images_dir}/a.png)\n\nSee ![x]({images_dir}/a.png).",
+            images_dir,
+            optimize=True,
+            convert_png_to_webp=True,
+        )
+
+        assert stats["updated_content"] == (
+            f"![](./images/a.webp)\n\nSee ![x]({images_dir}/a.webp)."
+        )
+
+    def test_extract_leaves_other_books_images_alone(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        images_dir = tmp_path / "images"
+        extract_dir = images_dir / ".epub2md-book" / "OEBPS"
+        extract_dir.mkdir(parents=True)
+        Image.new("RGB", (400, 400)).save(images_dir / "other.png")
+        Image.new("RGB", (400, 400)).save(extract_dir / "own.png")
+
+        stats = extract_and_process_images(
+            f"![]({extract_dir}/own.png)",
+            images_dir,
+            optimize=True,
+            max_width=100,
+            max_height=100,
+            convert_png_to_webp=True,
+            extract_dir=extract_dir.parent,
+        )
+
+        assert stats["updated_content"] == "![](./images/own.webp)"
+        assert sorted(p.name for p in images_dir.iterdir() if p.is_file()) == ["other.png", "own.webp"]
+        with Image.open(images_dir / "other.png") as img:
+            assert img.size == (400, 400)
+
+    @pytest.mark.parametrize("name, fmt", [
+        ("a.png", "PNG"),
+        ("a.jpg", "JPEG"),
+        ("a.gif", "GIF"),
+        ("a.webp", "WEBP"),
+    ])
+    def test_probes_size_from_header(self, tmp_path, name, fmt):
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (321, 123)).save(tmp_path / name, format=fmt)
+
+        assert _probe_size(tmp_path / name) == (321, 123)
+
+    def test_probe_falls_back_for_unknown_formats(self, tmp_path):
+        assert _probe_size(make_image(tmp_path / "a.bmp", b"BM" + bytes(40))) is None
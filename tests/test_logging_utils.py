@@ -0,0 +1,37 @@
+"""Tests for the logging helpers."""
+
+import logging
+
+import pytest
+from epub2md.utils.logging_utils import setup_logging
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    yield root
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    root.setLevel(saved_level)
+
+
+class TestSetupLogging:
+    """Tests for root logger configuration."""
+
+    def test_installs_console_and_file_handlers(self, root_logger, tmp_path):
+        setup_logging(level="debug", log_file=str(tmp_path / "run.log"))
+        assert root_logger.level == logging.DEBUG
+        assert len(root_logger.handlers) == 2
+        assert root_logger.handlers[0].formatter is root_logger.handlers[1].formatter
+
+    def test_reconfiguring_closes_previous_file_handler(self, root_logger, tmp_path):
+        setup_logging(log_file=str(tmp_path / "first.log"))
+        file_handler = root_logger.handlers[1]
+        setup_logging(level="WARNING")
+        assert file_handler.stream is None
+        assert len(root_logger.handlers) == 1
+        assert root_logger.level == logging.WARNING
@@ -0,0 +1,147 @@
+"""Tests for the metadata processor."""
+
+import io
+import zipfile
+
+from epub2md.processors.metadata import (
+    EpubMetadata,
+    extract_epub_metadata,
+    extract_epub_metadata_batch,
+    extract_metadata_from_filename,
+    parse_opf_metadata,
+    parse_opf_metadata_stream,
+)
+
+OPF = b"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <dc:title>The Title</dc:title>
+    <dc:creator opf:role="aut">Jane Doe</dc:creator>
+    <dc:creator>John Roe</dc:creator>
+    <dc:language>en</dc:language>
+    <dc:subject>Fiction</dc:subject>
+    <dc:subject>Adventure</dc:subject>
+    <dc:identifier opf:scheme="uuid">urn:uuid:1234</dc:identifier>
+    <dc:identifier>isbn:9780000000000</dc:identifier>
+  </metadata>
+  <manifest>
+    <item id="ch1" href="ch1.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="ch1"/></spine>
+</package>
+"""
+
+CONTAINER = b"""<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/book.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+EXPECTED = {
+    "title": "The Title",
+    "author": "Jane Doe, John Roe",
+    "language": "en",
+    "subjects": ["Fiction", "Adventure"],
+    "identifier": "urn:uuid:1234",
+    "isbn": "isbn:9780000000000",
+}
+
+
+def make_epub(path, files):
+    with zipfile.ZipFile(path, "w") as epub:
+        for name, data in files.items():
+            epub.writestr(name, data)
+    return path
+
+
+class TestParseOpfMetadata:
+    """Tests for OPF metadata parsing."""
+
+    def test_parses_dublin_core(self):
+        assert parse_opf_metadata(OPF).as_dict() == EXPECTED
+
+    def test_accepts_str(self):
+        assert parse_opf_metadata(OPF.decode("utf-8")).as_dict() == EXPECTED
+
+    def test_parses_stream(self):
+        assert parse_opf_metadata_stream(io.BytesIO(OPF)).as_dict() == EXPECTED
+
+    def test_ignores_content_after_metadata(self):
+        truncated = OPF[:OPF.index(b"<manifest>")] + b"<manifest><item"
+        assert parse_opf_metadata(truncated).as_dict() == EXPECTED
+
+    def test_invalid_xml_returns_empty(self):
+        assert parse_opf_metadata(b"<package><metadata>") == EpubMetadata()
+
+    def test_returns_dataclass(self):
+        metadata = parse_opf_metadata(OPF)
+        assert metadata.title == "The Title"
+        assert metadata.subjects == ["Fiction", "Adventure"]
+        assert metadata.publisher is None
+        assert "publisher" not in metadata.as_dict()
+
+
+class TestExtractEpubMetadata:
+    """Tests for reading metadata out of an EPUB archive."""
+
+    def test_reads_opf_from_container(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", {
+            "META-INF/container.xml": CONTAINER,
+            "OEBPS/book.opf": OPF,
+        })
+        assert extract_epub_metadata(epub) == EXPECTED
+
+    def test_reads_opf_from_unnamespaced_container(self, tmp_path):
+        container = CONTAINER.replace(b' xmlns="urn:oasis:names:tc:opendocument:xmlns:container"', b"")
+        epub = make_epub(tmp_path / "book.epub", {
+            "META-INF/container.xml": container,
+            "OEBPS/book.opf": OPF,
+        })
+        assert extract_epub_metadata(epub) == EXPECTED
+
+    def test_falls_back_to_common_name(self, tmp_path):
+        epub = make_epub(tmp_path / "book.epub", {"OEBPS/content.opf": OPF})
+        assert extract_epub_metadata(epub) == EXPECTED
+
+    def test_empty_file_uses_filename(self, tmp_path):
+        epub = tmp_path / "01 - Empty.epub"
+        epub.write_bytes(b"")
+        assert extract_epub_metadata(epub) == {"title": "Empty"}
+
+    def test_bad_zip_uses_filename(self, tmp_path):
+        epub = tmp_path / "Jane Doe - Some Book.epub"
+        epub.write_bytes(b"not a zip")
+        assert extract_epub_metadata(epub) == {"author": "Jane Doe", "title": "Some Book"}
+
+
+class TestExtractEpubMetadataBatch:
+    """Tests for concurrent metadata extraction."""
+
+    def test_preserves_order(self, tmp_path):
+        good = make_epub(tmp_path / "book.epub", {"OEBPS/content.opf": OPF})
+        bad = tmp_path / "Jane Doe - Some Book.epub"
+        bad.write_bytes(b"not a zip")
+        result = extract_epub_metadata_batch([bad, good, bad], max_workers=2)
+        fallback = {"author": "Jane Doe", "title": "Some Book"}
+        assert result == [fallback, EXPECTED, fallback]
+
+    def test_empty(self):
+        assert extract_epub_metadata_batch([]) == []
+
+
+class TestExtractMetadataFromFilename:
+    """Tests for filename-based metadata fallback."""
+
+    def test_numbered_with_series(self):
+        result = extract_metadata_from_filename("01 - The Title (Saga Book 1)")
+        assert result == {"title": "The Title", "series": "Saga Book 1"}
+
+    def test_author_and_title(self):
+        result = extract_metadata_from_filename("Jane Doe - Some Book")
+        assert result == {"author": "Jane Doe", "title": "Some Book"}
+
+    def test_plain_title(self):
+        result = extract_metadata_from_filename("Just A Title")
+        assert result == {"title": "Just A Title"}